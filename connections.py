@@ -6,164 +6,288 @@ Created on Thu Jul 29 23:41:05 2021
 """
 
 from mh_logging import log
+from copy import copy
 
 class Component:
     """
     One side of a Connection object. A Connection will have two 
     Components, an origin and a destination.
     """
-    def __init__(self, xml, trace = None):
-        log.log_trace(self, "__init__", trace)
-        self.name = self.__class__.__name__
-        self.xml = xml
+    __slots__ = ("xml", "id", "type")
+    name = "Component"
+    @log.traced
+    def __init__(self, xml, trace = None, slim = False):
+        self.xml = None if slim else xml
         self.id = xml.attrib["ToolID"]
         self.type = xml.attrib["Connection"]
         
 class Connection:  
-    def __init__(self, connection_xml, trace = None):
-        log.log_trace(self, "__init__", trace)
-        inf_trace = {"source": "function call", 
-                     "parent": self.name + ".__init__"}
+    __slots__ = ("xml", "name", "wireless", "origin_xml", "origin", 
+                 "destination_xml", "destination")
+    @log.traced
+    def __init__(self, connection_xml, trace = None, slim = False):
         c = connection_xml
+        self.xml = None if slim else c
         self.name = c.attrib.get('name', None)
         self.wireless = (c.attrib.get('Wireless', "False") == "True")
             
-        self.origin_xml = c.find("Origin")
-        self.origin = Component(self.origin_xml, inf_trace)
+        origin_xml = c.find("Origin")
+        self.origin_xml = None if slim else origin_xml
+        self.origin = Component(origin_xml, slim = slim)
         
-        self.destination_xml = c.find("Destination")
-        self.destination = Component(self.destination_xml, inf_trace)
+        destination_xml = c.find("Destination")
+        self.destination_xml = None if slim else destination_xml
+        self.destination = Component(destination_xml, slim = slim)
+    
+    def copy(self):
+        """
+        Return a copy of the connection with its own origin and destination
+        Components, so it can be rewired independently
+        """
+        new = copy(self)
+        new.origin = copy(self.origin)
+        new.destination = copy(self.destination)
+        return new
 
 class Connections:
-    connections = []
-    def __init__(self, xml, trace = None):
-        log.log_trace(self, "__init__", trace)
-        inf_trace = {"source": "function call", 
-                     "parent": self.name + ".__init__"}
-        
-        self.xml = xml
-        self.connections = self.map_connections(xml, trace = inf_trace)
-        self.count = len(self.connections)
+    @log.traced
+    def __init__(self, xml, trace = None, slim = False):
+        self.xml = None if slim else xml
+        #insertion-ordered store of the position of each connection in the
+        #original workflow to its Connection object, and the reverse
+        self.connections_dict = {}
+        self.positions_dict = {}
+        self._added = 0
+        #adjacency maps of ToolID to the positions of the connections 
+        #leaving (outputs_dict) or entering (inputs_dict) that node. The 
+        #inner dicts are used as ordered sets so connections can be removed 
+        #in O(1).
+        self.outputs_dict = {}
+        self.inputs_dict = {}
+        #positions of the Connection objects this object may modify in
+        #place. None if it does not share any Connection objects.
+        self._owned = None
+        #an empty Connections object can be created by passing xml = None, 
+        #and populated one connection at a time with add
+        if not xml is None:
+            self.map_connections(xml, slim = slim)
+        self.count = len(self.connections_dict)
+    
+    @property
+    def connections(self):
+        """
+        List of Connection objects in workflow order
+        """
+        return list(self.connections_dict.values())
         
     def __iter__(self):
         """
         Allow iteration of node object like "for n in Connections". Equivalent 
         to doing "for n in Connections.connections"
         """
-        self._i = -1
-        return self
-    
-    def __next__(self):
-        if self._i < self.count - 1:
-            self._i += 1
-            return self.connections[self._i]
-        else:
-            raise StopIteration
+        return iter(self.connections)
 
-    def map_connections(self, xml, trace = None):
-        log.log_trace(self, "map_connections", trace)
-        inf_trace = {"source": "function call", 
-                     "parent": self.name + ".map_connections"}
+    @log.traced
+    def map_connections(self, xml, trace = None, slim = False):
         """
         For a given ElementTree xml object, returns a list of Connection
-        objects
+        objects and builds the adjacency maps used for node lookups
         """
         cnct = xml.find('Connections')
-        cd = [Connection(c, trace = inf_trace) for c in cnct]
+        cd = [Connection(c, slim = slim) for c in cnct]
+        for c in cd:
+            self.add(c)
         return cd
     
+    @log.traced
+    def add(self, c, trace = None):
+        """
+        Add a Connection object to the end of self.connections
+        """
+        i = self._added
+        self._added += 1
+        self.connections_dict[i] = c
+        self.positions_dict[c] = i
+        if not self._owned is None:
+            self._owned.add(i)
+        self.outputs_dict.setdefault(c.origin.id, {})[i] = None
+        self.inputs_dict.setdefault(c.destination.id, {})[i] = None
+        self.count = len(self.connections_dict)
+    
+    @log.traced
+    def copy(self, trace = None):
+        """
+        Return a new Connections object sharing the same Connection objects.
+        The copy is copy-on-write: rewiring a shared connection in either
+        object replaces it with a private copy, so the other is unaffected.
+        """
+        new = Connections(None)
+        new.connections_dict = dict(self.connections_dict)
+        new.positions_dict = dict(self.positions_dict)
+        new._added = self._added
+        new.outputs_dict = {k: dict(v) for k, v in self.outputs_dict.items()}
+        new.inputs_dict = {k: dict(v) for k, v in self.inputs_dict.items()}
+        new.count = self.count
+        new._owned = set()
+        self._owned = set()
+        return new
+    
+    def _writable(self, c):
+        """
+        Return the position of a Connection object, and a version of it that 
+        can be modified in place without affecting any other Connections 
+        object
+        """
+        i = self.positions_dict[c]
+        if self._owned is None or i in self._owned:
+            return i, c
+        
+        c_new = c.copy()
+        del self.positions_dict[c]
+        self.positions_dict[c_new] = i
+        self.connections_dict[i] = c_new
+        self._owned.add(i)
+        return i, c_new
+    
+    def _link(self, adjacency, node_id, i):
+        """
+        Add a connection position to the adjacency map of a node, keeping
+        its positions in workflow order
+        """
+        positions = adjacency.setdefault(node_id, {})
+        #positions are kept sorted, so the last is the largest. A rewired
+        #connection can come before it, and the map is then re-sorted.
+        if positions and i < next(reversed(positions)):
+            positions[i] = None
+            adjacency[node_id] = dict.fromkeys(sorted(positions))
+        else:
+            positions[i] = None
+    
+    def _get(self, positions):
+        """
+        Return the list of Connection objects at the given positions
+        """
+        return [self.connections_dict[i] for i in positions]
+    
+    @log.traced
     def next_node(self, node_id, trace = None):
-        log.log_trace(self, "next_node", trace)
         """
         For a given node, returns a list of the node(s) that have input 
         connections from that node.
         """
-        destinations = []
-        for c in self.connections:
-            if c.origin.id == str(node_id):
-                destinations.append(c.destination)
-        return destinations
+        return [c.destination 
+                for c in self._get(self.outputs_dict.get(str(node_id), ()))]
     
+    @log.traced
     def previous_node(self, node_id, trace = None):
-        log.log_trace(self, "previous_node", trace)
         """
         For a given node, returns a list of the node(s) that are inputs of
         that node
         """
-        origins = []
-        for c in self.connections:
-            if c.destination.id == str(node_id):
-                origins.append(c.origin)
-        return origins
+        return [c.origin 
+                for c in self._get(self.inputs_dict.get(str(node_id), ()))]
     
+    @log.traced
     def get_connections(self, node_id, trace = None):
-        log.log_trace(self, "get_connections", trace)
         """
         For a given node, returns a list of incoming and outgoing connections
         """
-        cons = []
-        for c in self.connections:
-            if c.origin.id == node_id or c.destination.id == node_id:
-                cons.append(c)
-        return cons
+        #a connection from a node to itself is only returned once, and the 
+        #order the connections appear in the workflow is preserved
+        positions = set(self.outputs_dict.get(node_id, ()))
+        positions.update(self.inputs_dict.get(node_id, ()))
+        return self._get(sorted(positions))
     
+    @log.traced
     def get_input_connections(self, node_id, trace = None):
-        log.log_trace(self, "get_input_connections", trace)
         """
         For a given node, returns a list of incoming connections
         """
-        cons = []
-        for c in self.connections:
-            if c.destination.id == node_id:
-                cons.append(c)
-        return cons
+        return self._get(self.inputs_dict.get(node_id, ()))
     
+    @log.traced
     def get_output_connections(self, node_id, trace = None):
-        log.log_trace(self, "get_output_connections", trace)
         """
         For a given node, returns a list of outgoing connections
         """
-        cons = []
-        for c in self.connections:
-            if c.origin.id == node_id:
-                cons.append(c)
-        return cons
+        return self._get(self.outputs_dict.get(node_id, ()))
     
+    @log.traced
     def is_node_multiconnection(self, node_id, trace = None):
-        log.log_trace(self, "is_node_multiconnection", trace)
-        inf_trace = {"source": "function call", 
-                     "parent": self.name + ".is_node_multiconnection"}
         """
-        For a given node, returns a list of outgoing connections
+        For a given node, returns whether it has multiple incoming 
+        connections or multiple types of outgoing connection
         """
-        if len(self.get_input_connections(node_id, inf_trace)) > 1:
+        if len(self.inputs_dict.get(node_id, ())) > 1:
             return True
         else:
-            c_out = self.get_output_connections(node_id, inf_trace)
-            types = [c.origin.type for c in c_out]
-            return len(list(set(types))) > 1
+            c_out = self._get(self.outputs_dict.get(node_id, ()))
+            types = {c.origin.type for c in c_out}
+            return len(types) > 1
         
+    @log.traced
     def remove(self, c, trace = None):
-        log.log_trace(self, "is_node_multiconnection", trace)
         """
         Removes a given Connection object from self.connections
         """
-        self.connections.remove(c)
-        self.count = len(self.connections)
+        i = self.positions_dict.pop(c)
+        del self.connections_dict[i]
+        if not self._owned is None:
+            self._owned.discard(i)
+        del self.outputs_dict[c.origin.id][i]
+        del self.inputs_dict[c.destination.id][i]
+        self.count -= 1
+    
+    @log.traced
+    def set_origin(self, c, node_id, connection_type = None, trace = None):
+        """
+        Rewire a given Connection object to start from a different node,
+        keeping the adjacency maps up to date. Optionally change the type of
+        the origin as well. Returns the rewired Connection object, which is
+        a new object if the original was shared with a copy.
+        """
+        i, c = self._writable(c)
+        del self.outputs_dict[c.origin.id][i]
+        c.origin.id = node_id
+        if not connection_type is None:
+            c.origin.type = connection_type
+        self._link(self.outputs_dict, node_id, i)
+        return c
+    
+    @log.traced
+    def set_destination(self, c, node_id, connection_type = None, 
+                        trace = None):
+        """
+        Rewire a given Connection object to end at a different node,
+        keeping the adjacency maps up to date. Optionally change the type of
+        the destination as well. Returns the rewired Connection object, 
+        which is a new object if the original was shared with a copy.
+        """
+        i, c = self._writable(c)
+        del self.inputs_dict[c.destination.id][i]
+        c.destination.id = node_id
+        if not connection_type is None:
+            c.destination.type = connection_type
+        self._link(self.inputs_dict, node_id, i)
+        return c
+    
+    @property
+    def rewired(self):
+        """
+        List of the Connection objects that have been rewired since this
+        object was copied
+        """
+        return [] if self._owned is None else self._get(sorted(self._owned))
         
+    @log.traced
     def remove_node_connections(self, node_id, trace = None):
-        log.log_trace(self, "is_node_multiconnection", trace)
-        inf_trace = {"source": "function call", 
-                     "parent": self.name + ".remove_node_connections"}
         """
-        Remove all connections to and from a given node.
+        Remove all connections to and from a given node or list of nodes.
         """
-        if type(node_id) == list:
-            for nid in node_id:
-                self.remove_node_connections(nid, inf_trace)
-        else:
-            for c in self.get_connections(node_id, inf_trace):
-                self.remove(c, inf_trace)
+        node_ids = [node_id] if type(node_id) == str else node_id
+        for nid in node_ids:
+            for c in self.get_connections(nid):
+                self.remove(c)
         
     def attr(self, attr):
         out = []
@@ -7,91 +7,166 @@ Created on Tue Aug  3 22:52:30 2021
 
 from mh_logging import log
 from nodes import Nodes, Node
+from spatial import SpatialIndex
+from copy import copy
 
 class Container(Node):
-    disabled = False
-    folded = False
-    fill_colour = '#ffffff'
-    text_colour = '#000000'
-    border_colour = '#314c4a'
-    caption = None
-    nodes = None
-    def __init__(self, xml, trace = None):
-        log.log_trace(self, "__init__", trace)
-        inf_trace = {"source": "function call", 
-                     "parent": self.__class__.__name__ + ".__init__"}
-        
+    __slots__ = ("child_nodes_xml", "nodes", "disabled", "folded", "width",
+                 "height", "style", "fill_colour", "text_colour", 
+                 "border_colour", "caption")
+    @log.traced
+    def __init__(self, xml, trace = None, slim = False):
         #initialise parent Node class
-        super(Container, self).__init__(xml)
-        self.child_nodes_xml = self.xml.find('ChildNodes')
-        self.nodes = Nodes(self.child_nodes_xml, node_tag = "", 
-                           trace = inf_trace)
+        super(Container, self).__init__(xml, slim = slim)
+        child_nodes_xml = xml.find('ChildNodes')
+        self.child_nodes_xml = None if slim else child_nodes_xml
+        self.nodes = Nodes(child_nodes_xml, node_tag = "", slim = slim)
         
-        self.disabled = (self.config.find("Disabled").attrib['value'] == "True")
-        self.folded = (self.config.find("Folded").attrib['value'] == "True")
+        config = self.config
+        self.disabled = (config.find("Disabled").attrib['value'] == "True")
+        self.folded = (config.find("Folded").attrib['value'] == "True")
         
         self.width = int(self.position['width'])
         self.height = int(self.position['height'])
         
-        self.style = self.config.find("Style")
-        self.fill_colour = self.style.attrib["FillColor"]
-        self.text_colour = self.style.attrib["TextColor"]
-        self.border_colour = self.style.attrib["BorderColor"]
+        style = config.find("Style")
+        self.style = None if slim else style
+        self.fill_colour = style.attrib["FillColor"]
+        self.text_colour = style.attrib["TextColor"]
+        self.border_colour = style.attrib["BorderColor"]
         
-        self.caption = self.config.find("Caption").text
+        self.caption = config.find("Caption").text
     
 class Containers:
-    containers = []
-    def __init__(self, xml, trace = None):
-        log.log_trace(self, "__init__", trace)
-        inf_trace = {"source": "function call", 
-                     "parent": self.__class__.__name__ + ".__init__"}
-        
-        self.xml = xml
-        self.containers = self.map_containers(xml, inf_trace)
-        self.containers_dict = {c.id: c for c in self.containers}
-        self.count = len(self.containers)
+    #SpatialIndex of the rectangle of each container, built on first use
+    _spatial_index = None
+    @log.traced
+    def __init__(self, xml, trace = None, slim = False):
+        self.xml = None if slim else xml
+        #insertion-ordered dict of ToolID to Container object. An empty 
+        #Containers object can be created by passing xml = None, and 
+        #populated one container at a time with add
+        self.containers_dict = ({} if xml is None else 
+                                {c.id: c for c in self.map_containers(
+                                    xml, slim = slim)})
+        self.count = len(self.containers_dict)
+    
+    @property
+    def containers(self):
+        """
+        List of Container objects in workflow order
+        """
+        return list(self.containers_dict.values())
     
     def __iter__(self):
         """
         Allow iteration of node object like "for n in Containers". Equivalent 
         to doing "for n in Containers.containers"
         """
-        self._i = -1
-        return self
-    
-    def __next__(self):
-        if self._i < self.count - 1:
-            self._i += 1
-            return self.containers[self._i]
-        else:
-            raise StopIteration
+        return iter(self.containers)
             
+    @log.traced
     def get_container(self, node_id, trace = None):
-        log.log_trace(self, "get_container", trace)
         return self.containers_dict[node_id]
+    
+    @property
+    def spatial_index(self):
+        """
+        SpatialIndex of the rectangle of every container, by ToolID. It is 
+        built on first use and kept up to date as containers are added, 
+        minimised and removed.
+        """
+        if self._spatial_index is None:
+            index = SpatialIndex()
+            for c in self.containers_dict.values():
+                index.insert(c.id, (c.x, c.y, c.x + c.width, 
+                                    c.y + c.height))
+            self._spatial_index = index
+        return self._spatial_index
+    
+    def _index(self, c):
+        if not self._spatial_index is None:
+            self._spatial_index.insert(c.id, (c.x, c.y, c.x + c.width, 
+                                              c.y + c.height))
+    
+    @log.traced
+    def get_containers_in(self, box, trace = None):
+        """
+        Return the list of Container objects overlapping the given (x1, y1,
+        x2, y2) box
+        """
+        return [self.containers_dict[cid] 
+                for cid in self.spatial_index.query(box)]
+    
+    @log.traced
+    def get_container_at(self, x, y, trace = None):
+        """
+        Return the innermost Container object containing the given 
+        position, or None if it is not in a container
+        """
+        containers = [self.containers_dict[cid] 
+                      for cid in self.spatial_index.query_point(x, y)]
+        if not containers:
+            return None
+        return min(containers, key = lambda c: c.width*c.height)
 
-    def map_containers(self, xml, trace = None):
-        log.log_trace(self, "map_containers", trace)
-        inf_trace = {"source": "function call", 
-                     "parent": self.__class__.__name__ + ".map_containers"}
+    @log.traced
+    def map_containers(self, xml, trace = None, slim = False):
         """
         For a given ElementTree xml object, returns a dictionary of ToolIDs 
         and Node objects
         """
         containers = []
         for n in xml.findall("Nodes/Node"):
-            node = Node(n, trace = inf_trace)
-            if node.type == "AlteryxGuiToolkit.ToolContainer.ToolContainer":
-                containers.append(Container(n, inf_trace))
+            plugin = n.find("GuiSettings").attrib.get("Plugin", None)
+            if plugin == "AlteryxGuiToolkit.ToolContainer.ToolContainer":
+                containers.append(Container(n, slim = slim))
         return containers
     
+    @log.traced
+    def add(self, container, trace = None):
+        """
+        Add a single Container object
+        """
+        self.containers_dict[container.id] = container
+        self._index(container)
+        self.count = len(self.containers_dict)
+    
+    @log.traced
+    def copy(self, trace = None):
+        """
+        Return a new Containers object sharing the same Container objects,
+        which containers can be removed from or minimised independently of
+        this one
+        """
+        new = Containers(None)
+        new.containers_dict = dict(self.containers_dict)
+        new.count = self.count
+        return new
+    
+    @log.traced
+    def minimise(self, container_id, width = 150, height = 20, trace = None):
+        """
+        Shrink the container with the given node id. The Container object is
+        replaced by a resized copy, so other Containers objects sharing it
+        are unaffected.
+        """
+        c = self.containers_dict[container_id]
+        c_new = copy(c)
+        c_new.width = width
+        c_new.height = height
+        self.containers_dict[container_id] = c_new
+        self._index(c_new)
+        return c_new
+    
+    @log.traced
     def remove(self, container_id, trace = None):
-        log.log_trace(self, "remove", trace)
         """
         Remove the container object with the given node id.
         """
-        self.containers.remove(self.containers_dict[container_id])
-        self.count -= 1
+        del self.containers_dict[container_id]
+        if not self._spatial_index is None:
+            self._spatial_index.remove(container_id)
+        self.count = len(self.containers_dict)
         
            
\ No newline at end of file
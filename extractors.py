@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 14:37:26 2026
+
+@author: marcu
+"""
+
+from mh_logging import log
+import mv_formulas as mvf
+
+def child_elements(config):
+    """
+    Return a dictionary of tag to the first child element of a given
+    element with that tag, so that the children of a configuration can be
+    looked up repeatedly with a single scan
+    """
+    children = {}
+    for c in config:
+        children.setdefault(c.tag, c)
+    return children
+
+class Extractors:
+    """
+    Registry of the functions extracting formulas, filters and selections
+    from the configuration of each type of tool.
+
+    An extractor is called as extractor(node, config) with the parsed
+    Configuration element of the node, and returns a list of dictionaries
+    to add to its collection. Extractors are looked up by node type, which
+    for macros is the file name of the macro, so third-party tools and
+    macros can be supported by registering extractors for their types.
+    """
+    collections = ("formulas", "filters", "selections")
+    def __init__(self, trace = None):
+        #node type to a list of (collection, extractor) tuples
+        self.extractors_dict = {}
+
+    def __contains__(self, node_type):
+        return node_type in self.extractors_dict
+
+    @log.traced
+    def register(self, collection, *node_types, trace = None):
+        """
+        Decorator registering a function as the extractor of a collection
+        for one or more node types. Can also be called directly as
+        register(collection, *node_types)(extractor).
+        """
+        if not collection in self.collections:
+            raise ValueError("Invalid collection %s. Must be one of %s" %
+                             (collection, ", ".join(self.collections)))
+        def decorator(extractor):
+            for node_type in node_types:
+                self.extractors_dict.setdefault(node_type, []).append(
+                    (collection, extractor))
+            return extractor
+        return decorator
+
+    @log.traced
+    def unregister(self, node_type, trace = None):
+        """
+        Remove all extractors for a given node type
+        """
+        self.extractors_dict.pop(node_type, None)
+
+    @log.traced
+    def copy(self, trace = None):
+        """
+        Return a new registry with the same extractors, which extractors can
+        be registered with without affecting this one
+        """
+        new = Extractors()
+        new.extractors_dict = {k: list(v)
+                               for k, v in self.extractors_dict.items()}
+        return new
+
+    @log.traced
+    def extract(self, nodes, trace = None):
+        """
+        Extract every collection from the given nodes in a single pass. The
+        configuration of each node with a registered extractor is read
+        once. Returns a dictionary of collection name to list.
+        """
+        results = {c: [] for c in self.collections}
+        extractors_dict = self.extractors_dict
+        for n in nodes:
+            if n.is_decorator: continue
+            registered = extractors_dict.get(n.type, None)
+            if registered is None: continue
+
+            config = n.config
+            for collection, extractor in registered:
+                results[collection] += extractor(n, config)
+        return results
+
+#default registry used by Workflow
+extractors = Extractors()
+
+@extractors.register("formulas", "AlteryxBasePluginsGui.Formula.Formula",
+                     "LockInGui.LockInFormula.LockInFormula")
+def extract_formula(n, config):
+    formulas = config.find('FormulaFields').findall('FormulaField')
+    return [{'id': n.id,
+             'node': n,
+             'order_in_node': i,
+             'field': f.attrib['field'],
+             'expression': f.attrib['expression'],
+             'type': f.attrib['type'],
+             'size': f.attrib.get('size', None),
+             'context': None
+             } for i, f in enumerate(formulas)]
+
+@extractors.register("formulas",
+                     "AlteryxBasePluginsGui.MultiRowFormula.MultiRowFormula")
+def extract_multi_row_formula(n, config):
+    children = child_elements(config)
+    fdict = {'id': n.id,
+             'node': n,
+             'order_in_node': 0,
+             'field': None,
+             'expression': children["Expression"].attrib.get('value', None),
+             'type': None,
+             'size': None,
+             'context': None
+             }
+
+    if children['UpdateField'].attrib['value'] == 'True':
+        fdict['field'] = children['UpdateField_Name'].text
+    else:
+        fdict['field'] = children['CreateField_Name'].text
+        fdict['type'] = children['CreateField_Type'].text
+        fdict['size'] = children['CreateField_Size'].text
+        fdict['context'] = {
+            "Rows that don't exist:": children['OtherRows'].text,
+            'Group by': children['GroupByFields'].text}
+    return [fdict]
+
+@extractors.register(
+    "formulas", "AlteryxBasePluginsGui.MultiFieldFormula.MultiFieldFormula")
+def extract_multi_field_formula(n, config):
+    children = child_elements(config)
+    expression = children['Expression'].text
+    formulas = []
+    for i, field in enumerate(children["Fields"]):
+        #selected keys have nothing. Unselected have selected = "False"
+        if field.attrib.get("selected", None) == "False":
+            continue
+        formulas.append({'id': n.id,
+                         'node': n,
+                         'order_in_node': i,
+                         'field': field.attrib["name"],
+                         'expression': expression,
+                         'type': None,
+                         'size': None,
+                         'context': None
+                         })
+    return formulas
+
+@extractors.register("formulas",
+                     "AlteryxBasePluginsGui.DynamicRename.DynamicRename")
+def extract_dynamic_rename(n, config):
+    children = child_elements(config)
+    if children["RenameMode"].text != "Formula":
+        return []
+    return [{'id': n.id,
+             'node': n,
+             'order_in_node': 0,
+             'field': "__FieldName__",
+             'expression': children["Expression"].attrib.get("value", None),
+             'type': None,
+             'size': None,
+             'context': None
+             }]
+
+@extractors.register("formulas",
+                     "AlteryxBasePluginsGui.GenerateRows.GenerateRows")
+def extract_generate_rows(n, config):
+    children = child_elements(config)
+    fdict = {'id': n.id,
+             'node': n,
+             'order_in_node': 0,
+             'field': None,
+             'expression': children['Expression_Loop'].text,
+             'type': None,
+             'size': None,
+             'context': {
+                 "Initial value": children['Expression_Init'].text,
+                 "Loop condition:": children['Expression_Cond'].text
+                 }
+             }
+    if children["UpdateField"].attrib["value"] == "True":
+        fdict["field"] = children["UpdateField_Name"].text
+    else:
+        fdict["field"] = children["CreateField_Name"].text
+        fdict["type"] = children["CreateField_Type"].text
+        fdict["size"] = children["CreateField_Size"].text
+    return [fdict]
+
+@extractors.register("filters", "AlteryxBasePluginsGui.Filter.Filter",
+                     "LockInGui.LockInFilter.LockInFilter")
+def extract_filter(n, config):
+    children = child_elements(config)
+    fdict = {'id': n.id,
+             'node': n,
+             'mode': children["Mode"].text,
+             'field': None,
+             'expression': None
+             }
+    if fdict['mode'] == 'Simple':
+        try:
+            fdict['field'] = children["Simple"].find("Field").text
+        except (KeyError, AttributeError):
+            fdict['field'] = None
+        fdict['expression'] = n.annotation.default_text
+    elif fdict['mode'] == 'Custom':
+        fdict['expression'] = children["Expression"].text
+        fdict['field'] = mvf.fields_from_formula(fdict['expression'],
+                                                 mode = "Alteryx")
+    return [fdict]
+
+@extractors.register("selections",
+                     "AlteryxBasePluginsGui.AlteryxSelect.AlteryxSelect",
+                     "LockInGui.LockInSelect.LockInSelect")
+def extract_selection(n, config):
+    select_fields = child_elements(config).get("SelectFields", ())
+    selections = []
+    for field in select_fields:
+        if field.tag != "SelectField": continue
+        attrib = field.attrib
+        sdict = {'id': n.id,
+                 'node': n,
+                 'field': attrib["field"],
+                 'selected': attrib.get('selected', None),
+                 'rename': attrib.get('rename', None),
+                 'type': attrib.get('type', None),
+                 'size': attrib.get('size', None)}
+
+        if (sdict['selected'] == 'True' and sdict['rename'] is None
+            and sdict['type'] is None and sdict['size'] is None):
+            continue
+        selections.append(sdict)
+    return selections
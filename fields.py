@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 12:20:51 2026
+
+@author: marcu
+"""
+
+from mh_logging import log
+from bisect import bisect_left
+import re
+
+#names used where fields are, which are not fields of the data: the unknown
+#fields of a Select, the field being renamed by a Dynamic Rename, and the
+#current field of a Multi-Field Formula
+pseudo_fields = {"*Unknown", "__FieldName__", "_CurrentField_",
+                 "_CurrentFieldName_", "_CurrentFieldType_"}
+#prefixes of workflow constants, e.g. [Engine.WorkflowDirectory]
+constant_prefixes = ("Engine.", "User.", "Question.")
+#a field of another row in a Multi-Row Formula, e.g. [Row-1:Amount]
+_row_field = re.compile(r"Row[-+]\d+:(.+)\Z", re.DOTALL)
+
+def field_name(name):
+    """
+    Return the name of the field that a name found in a formula or tool
+    configuration refers to, or None if it is not a field
+    """
+    if name in pseudo_fields or name.startswith(constant_prefixes):
+        return None
+    match = _row_field.match(name)
+    return name if match is None else match.group(1)
+
+class FieldIndex:
+    """
+    Inverted index from field name to the nodes that read or write that
+    field.
+    """
+    @log.traced
+    def __init__(self, trace = None):
+        #field name to a dict of ToolID to Node object, used as an ordered set
+        self.fields_dict = {}
+        #ToolID to the set of field names used by that node
+        self.node_fields = {}
+        #sorted field names for prefix lookups, rebuilt when fields are added
+        self._sorted = None
+        self.count = 0
+
+    def __contains__(self, field):
+        return field in self.fields_dict
+
+    def __iter__(self):
+        """
+        Allow iteration of the field names like "for f in FieldIndex"
+        """
+        return iter(self.fields_dict)
+
+    @log.traced
+    def add(self, field, node, trace = None):
+        """
+        Record that a node reads or writes a given field, or list of fields.
+        Names that are not fields, see field_name, are ignored, and fields
+        of other rows are recorded as the field itself.
+        """
+        if field is None:
+            return
+        if type(field) == list:
+            for f in field:
+                self.add(f, node)
+            return
+        field = field_name(field)
+        if field is None:
+            return
+
+        if not field in self.fields_dict:
+            self.fields_dict[field] = {}
+            self._sorted = None
+            self.count += 1
+        self.fields_dict[field][node.id] = node
+        self.node_fields.setdefault(node.id, set()).add(field)
+
+    @log.traced
+    def remove_node(self, node_id, trace = None):
+        """
+        Remove a node from every field it is indexed under
+        """
+        for field in self.node_fields.pop(node_id, ()):
+            del self.fields_dict[field][node_id]
+            if not self.fields_dict[field]:
+                del self.fields_dict[field]
+                self._sorted = None
+                self.count -= 1
+
+    @log.traced
+    def get_nodes(self, field, prefix = False, trace = None):
+        """
+        Return the list of nodes that read or write the given field. If
+        prefix is True, return the nodes for every field starting with the
+        given string instead.
+        """
+        if not prefix:
+            return list(self.fields_dict.get(field, {}).values())
+
+        nodes = {}
+        for f in self.get_fields(field):
+            nodes.update(self.fields_dict[f])
+        return list(nodes.values())
+
+    @log.traced
+    def get_node_ids(self, field, trace = None):
+        """
+        Return the set of ToolIDs of the nodes that read or write the given
+        field
+        """
+        return set(self.fields_dict.get(field, ()))
+
+    @log.traced
+    def get_fields(self, prefix, trace = None):
+        """
+        Return the sorted list of field names starting with the given prefix
+        """
+        if self._sorted is None:
+            self._sorted = sorted(self.fields_dict)
+        fields = []
+        for f in self._sorted[bisect_left(self._sorted, prefix):]:
+            if not f.startswith(prefix):
+                break
+            fields.append(f)
+        return fields
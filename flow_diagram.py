@@ -6,12 +6,499 @@ Created on Mon Aug  2 20:02:09 2021
 """
 
 from mh_logging import log
-from PIL import Image, ImageDraw, ImageFont
-from mountain_view_alteryx import Workflow
-from datetime import datetime
+from spatial import SpatialIndex, intersects, bounding_box
+from xml.sax.saxutils import escape, quoteattr
+from functools import cached_property
+from abc import ABC, abstractmethod
+import os
+import threading
 
+#PIL modules, imported on first draw so that importing this module does not
+#load the rendering dependencies
+_pil = None
+
+def pil():
+    """
+    Return the PIL Image, ImageDraw and ImageFont modules, importing them on
+    first use
+    """
+    global _pil
+    if _pil is None:
+        from PIL import Image, ImageDraw, ImageFont
+        _pil = (Image, ImageDraw, ImageFont)
+    return _pil
+
+class TextCache:
+    """
+    Process-wide cache of fonts, and of text rendered with them. Labels 
+    such as tool types repeat across a diagram, so each is only rasterised
+    and measured once and then stamped onto the canvas as a mask.
+    """
+    def __init__(self, max_size = 4096):
+        self.max_size = max_size
+        #(font name, size) to font object
+        self.fonts = {}
+        #(text, font name, size) to (mask image, (x offset, y offset))
+        self.masks = {}
+        self._lock = threading.Lock()
+    
+    def font(self, name, size):
+        """
+        Return the TrueType font with the given name and size, falling back
+        to the default PIL font if it cannot be found
+        """
+        key = (name, size)
+        font = self.fonts.get(key, None)
+        if font is None:
+            Image, ImageDraw, ImageFont = pil()
+            try:
+                font = ImageFont.truetype(name, size)
+            except OSError:
+                try:
+                    font = ImageFont.load_default(size = size)
+                except TypeError:
+                    font = ImageFont.load_default()
+            self.fonts[key] = font
+        return font
+    
+    def mask(self, text, name, size):
+        """
+        Return the text rendered as a greyscale mask, and the offset from
+        the drawing position to the top left of the mask
+        """
+        key = (text, name, size)
+        cached = self.masks.get(key, None)
+        if cached is None:
+            #fonts are not safe to render with from several threads at once
+            with self._lock:
+                cached = self.masks.get(key, None)
+                if cached is None:
+                    cached = self._render(text, name, size)
+                    if len(self.masks) >= self.max_size:
+                        self.masks.clear()
+                    self.masks[key] = cached
+        return cached
+    
+    def _render(self, text, name, size):
+        Image, ImageDraw, ImageFont = pil()
+        font = self.font(name, size)
+        left, top, right, bottom = font.getbbox(text)
+        mask = Image.new("L", (max(right - left, 1), 
+                               max(bottom - top, 1)), 0)
+        ImageDraw.Draw(mask).text((-left, -top), text, fill = 255,
+                                  font = font)
+        return (mask, (left, top))
+
+#shared by every FlowDiagram
+text_cache = TextCache()
+
+class Layout:
+    """
+    Table of the positions of the nodes and containers of a workflow on a
+    diagram, scaled and offset so that the top left node is border from the
+    edge of the canvas. The positions are computed from the workflow once,
+    and the workflow itself is never modified, so it can be drawn any number
+    of times, or by several diagrams at once.
+    """
+    @log.traced
+    def __init__(self, workflow, scale = 1, border = 0, node_width = 0,
+                 node_height = 0, container_padding = 0, trace = None):
+        self.node_width = node_width
+        self.node_height = node_height
+        self.container_padding = container_padding
+        containers_dict = workflow.containers.containers_dict
+        #ToolID to (x, y) of each node. Containers are positioned from the
+        #Container object, which in a meta workflow may be a minimised copy
+        self.nodes = {}
+        #ToolIDs of the containers, including those nested in other
+        #containers, which are drawn as nodes
+        self.container_ids = set(containers_dict)
+        for n in workflow.nodes:
+            if n.is_container:
+                self.container_ids.add(n.id)
+            n = containers_dict.get(n.id, n)
+            self.nodes[n.id] = (n.x*scale, n.y*scale)
+        
+        xs = [xy[0] for xy in self.nodes.values()]
+        ys = [xy[1] for xy in self.nodes.values()]
+        self.x_offset = -1*min(xs) + border
+        self.y_offset = -1*min(ys) + border
+        self.size = (max(xs) + self.x_offset + node_width + border,
+                     max(ys) + self.y_offset + node_height + border)
+        
+        x_offset, y_offset = self.x_offset, self.y_offset
+        for node_id, (x, y) in self.nodes.items():
+            self.nodes[node_id] = (x + x_offset, y + y_offset)
+        #ToolID to (x, y, width, height) of each container
+        self.containers = {c.id: (c.x*scale + x_offset, c.y*scale + y_offset,
+                                  c.width*scale, c.height*scale)
+                           for c in containers_dict.values()}
+    
+    def position(self, node_id):
+        """
+        Return the (x, y) of the node or container with the given id
+        """
+        c = self.containers.get(node_id, None)
+        if not c is None:
+            return c[:2]
+        return self.nodes[node_id]
+    
+    @cached_property
+    def index(self):
+        """
+        SpatialIndex of the box of every container and node drawn on the
+        diagram, by ToolID, in the order they are drawn. Built on first use.
+        """
+        index = SpatialIndex(cell_size = 4*max(self.node_width, 
+                                               self.node_height, 1))
+        padding = self.container_padding
+        for node_id, (x, y, width, height) in self.containers.items():
+            index.insert(node_id, (x, y, x + width + padding, 
+                                   y + height + padding))
+        container_ids = self.container_ids
+        for node_id, (x, y) in self.nodes.items():
+            if node_id in container_ids: continue
+            index.insert(node_id, (x, y, x + self.node_width, 
+                                   y + self.node_height))
+        return index
+
+class Backend(ABC):
+    """
+    Interface of the drawing backends of a FlowDiagram. Coordinates are in
+    pixels of the diagram, with the origin at the top left.
+    
+    begin is called once with the size of the diagram before anything is
+    drawn, then each shape is drawn in order, then end is called once. If
+    origin is set, the diagram drawn is the part of size size with its top
+    left at origin.
+    """
+    origin = (0, 0)
+    @abstractmethod
+    def begin(self, size, background):
+        """
+        Start a diagram of the given (width, height) and background colour
+        """
+        pass
+    
+    @abstractmethod
+    def outline(self, vertices, colour, width, trace = None):
+        """
+        Draw a closed outline with rounded corners between the vertices
+        """
+        pass
+    
+    @abstractmethod
+    def box(self, vertices, outline, fill, width, trace = None):
+        """
+        Draw a filled rectangle with the given outline, from a list of its
+        four corners starting at the top left and going anticlockwise
+        """
+        pass
+    
+    @abstractmethod
+    def text(self, xy, text, colour, font_name, font_size, trace = None):
+        """
+        Draw text with its top left at the given coordinates
+        """
+        pass
+    
+    @abstractmethod
+    def lines(self, lines, colour, width, trace = None):
+        """
+        Draw a batch of lines, each a tuple of vertices. Lines with more 
+        than two vertices have rounded joints.
+        """
+        pass
+    
+    def end(self):
+        pass
+
+class RasterBackend(Backend):
+    """
+    Draws the diagram onto an in-memory PIL image, canvas. If origin is
+    given, the canvas is the part of the diagram with its top left at 
+    origin, e.g. a single tile.
+    """
+    def __init__(self, origin = (0, 0)):
+        self.origin = origin
+        self.canvas = None
+        self.draw = None
+    
+    def begin(self, size, background):
+        Image, ImageDraw, ImageFont = pil()
+        self.canvas = Image.new('RGB', size, color = background)
+        self.draw = ImageDraw.Draw(self.canvas)
+    
+    def _shift(self, vertices):
+        """
+        Return the vertices relative to the origin of the canvas
+        """
+        x0, y0 = self.origin
+        if x0 == 0 and y0 == 0:
+            return vertices
+        return [(x - x0, y - y0) for x, y in vertices]
+    
+    def _outline(self, vertices, colour, width):
+        vertices = vertices + vertices
+        self.draw.line(vertices, fill = colour, width = width, 
+                       joint = "curve")
+    
+    @log.traced
+    def outline(self, vertices, colour, width, trace = None):
+        self._outline(self._shift(vertices), colour, width)
+    
+    @log.traced
+    def box(self, vertices, outline, fill, width, trace = None):
+        vertices = self._shift(vertices)
+        vertices = vertices + vertices
+        self.draw.rectangle([vertices[0], vertices[2]], fill, outline, width)
+        self._outline(vertices, outline, width)
+    
+    @log.traced
+    def text(self, xy, text, colour, font_name, font_size, trace = None):
+        mask, offset = text_cache.mask(text, font_name, font_size)
+        x0, y0 = self.origin
+        self.draw.bitmap((xy[0] + offset[0] - x0, xy[1] + offset[1] - y0),
+                         mask, fill = colour)
+    
+    @log.traced
+    def lines(self, lines, colour, width, trace = None):
+        line = self.draw.line
+        shift = self._shift
+        for vertices in lines:
+            vertices = shift(vertices)
+            if len(vertices) == 2:
+                line(vertices, fill = colour, width = width)
+            else:
+                line(vertices, fill = colour, width = width, joint = "curve")
+
+class SVGBackend(Backend):
+    """
+    Streams the diagram to an SVG file, writing each shape as it is drawn,
+    so that memory use does not grow with the size of the diagram
+    """
+    def __init__(self, filepath, origin = (0, 0)):
+        self.filepath = filepath
+        self.origin = origin
+        self._file = None
+    
+    def _points(self, vertices):
+        return quoteattr(" ".join("%s,%s" % xy for xy in vertices))
+    
+    def begin(self, size, background):
+        self._file = open(self.filepath, "w", encoding = "utf-8")
+        self._file.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d" '
+            'viewBox="%d %d %d %d">\n<rect x="%d" y="%d" width="100%%" '
+            'height="100%%" fill=%s />\n' % (
+                size[0], size[1], self.origin[0], self.origin[1], size[0],
+                size[1], self.origin[0], self.origin[1],
+                quoteattr(background)))
+    
+    @log.traced
+    def outline(self, vertices, colour, width, trace = None):
+        self._file.write(
+            '<polygon points=%s fill="none" stroke=%s stroke-width="%s" '
+            'stroke-linejoin="round" />\n' % (self._points(vertices), 
+                                               quoteattr(colour), width))
+    
+    @log.traced
+    def box(self, vertices, outline, fill, width, trace = None):
+        (x1, y1), (x2, y2) = vertices[0], vertices[2]
+        self._file.write(
+            '<rect x="%s" y="%s" width="%s" height="%s" fill=%s stroke=%s '
+            'stroke-width="%s" stroke-linejoin="round" />\n' % (
+                min(x1, x2), min(y1, y2), abs(x2 - x1), abs(y2 - y1),
+                quoteattr(fill), quoteattr(outline), width))
+    
+    @log.traced
+    def text(self, xy, text, colour, font_name, font_size, trace = None):
+        family = os.path.splitext(os.path.basename(font_name))[0]
+        self._file.write(
+            '<text x="%s" y="%s" fill=%s font-family=%s font-size="%s" '
+            'dominant-baseline="text-before-edge">%s</text>\n' % (
+                xy[0], xy[1], quoteattr(colour), quoteattr(family),
+                font_size, escape(str(text))))
+    
+    @log.traced
+    def lines(self, lines, colour, width, trace = None):
+        write = self._file.write
+        write('<g fill="none" stroke=%s stroke-width="%s" '
+              'stroke-linejoin="round">\n' % (quoteattr(colour), width))
+        for vertices in lines:
+            write('<polyline points=%s />\n' % self._points(vertices))
+        write('</g>\n')
+    
+    def end(self):
+        if not self._file is None:
+            self._file.write('</svg>\n')
+            self._file.close()
+            self._file = None
+
+class TiledBackend(Backend):
+    """
+    Renders the diagram as a grid of fixed-size PNG tiles written to a
+    directory, so that the whole diagram is never held as one image.
+    
+    Shapes are recorded as they are drawn, in a SpatialIndex of their
+    bounds. When the diagram is finished each tile is rendered with only
+    the shapes that intersect it, and tiles are rendered and written 
+    in parallel by worker threads, so peak memory is one tile per worker.
+    
+    Tiles are written to directory/<level>/<column>_<row>.png. Level 0 is 
+    full size. If levels is more than 1, a zoom pyramid is built, each 
+    level being half the size of the one before, downsampled from the 
+    tiles of the level before. If levels is None, levels are added until 
+    the diagram fits in a single tile.
+    """
+    def __init__(self, directory, tile_size = 1024, levels = 1, 
+                 workers = None):
+        self.directory = directory
+        self.tile_size = tile_size
+        self.levels = levels
+        self.workers = workers
+        #list of (method, args) of each shape drawn
+        self.shapes = []
+        #SpatialIndex of the bounds of each shape, by index in shapes
+        self.index = SpatialIndex(cell_size = tile_size)
+        #level to the number of tiles written
+        self.written = {}
+    
+    def begin(self, size, background):
+        self.size = size
+        self.background = background
+        self.shapes = []
+        self.index = SpatialIndex(cell_size = self.tile_size)
+        self.written = {}
+    
+    def _add(self, bounds, method, args):
+        """
+        Record a shape with bounds (x1, y1, x2, y2)
+        """
+        self.index.insert(len(self.shapes), bounds)
+        self.shapes.append((method, args))
+    
+    @log.traced
+    def outline(self, vertices, colour, width, trace = None):
+        self._add(bounding_box(vertices, width), "outline",
+                  (vertices, colour, width))
+    
+    @log.traced
+    def box(self, vertices, outline, fill, width, trace = None):
+        self._add(bounding_box(vertices, width), "box",
+                  (vertices, outline, fill, width))
+    
+    @log.traced
+    def text(self, xy, text, colour, font_name, font_size, trace = None):
+        mask, offset = text_cache.mask(text, font_name, font_size)
+        x1, y1 = xy[0] + offset[0], xy[1] + offset[1]
+        self._add((x1, y1, x1 + mask.size[0], y1 + mask.size[1]), "text",
+                  (xy, text, colour, font_name, font_size))
+    
+    @log.traced
+    def lines(self, lines, colour, width, trace = None):
+        #each line is recorded separately, so tiles only draw their own
+        for vertices in lines:
+            self._add(bounding_box(vertices, width), "lines",
+                      ([vertices], colour, width))
+    
+    def _filepath(self, level, col, row):
+        return os.path.join(self.directory, str(level), 
+                            "%d_%d.png" % (col, row))
+    
+    def _level_size(self, level):
+        return (-(-self.size[0] // 2**level), -(-self.size[1] // 2**level))
+    
+    def _grid(self, level):
+        """
+        Return a list of the (column, row) of every tile of a level
+        """
+        width, height = self._level_size(level)
+        cols = -(-width // self.tile_size)
+        rows = -(-height // self.tile_size)
+        return [(col, row) for row in range(rows) for col in range(cols)]
+    
+    def _tile_size(self, level, col, row):
+        width, height = self._level_size(level)
+        x0, y0 = col*self.tile_size, row*self.tile_size
+        return (min(self.tile_size, width - x0), 
+                min(self.tile_size, height - y0))
+    
+    @log.traced
+    def render_tile(self, col, row, trace = None):
+        """
+        Render and write the full size tile at the given column and row
+        """
+        x0 = self.origin[0] + col*self.tile_size
+        y0 = self.origin[1] + row*self.tile_size
+        width, height = self._tile_size(0, col, row)
+        backend = RasterBackend(origin = (x0, y0))
+        backend.begin((width, height), self.background)
+        shapes = self.shapes
+        for index in self.index.query((x0, y0, x0 + width, y0 + height)):
+            method, args = shapes[index]
+            getattr(backend, method)(*args)
+        backend.canvas.save(self._filepath(0, col, row))
+    
+    @log.traced
+    def render_parent(self, level, col, row, trace = None):
+        """
+        Render and write a tile of a zoomed out level by downsampling the
+        four tiles below it
+        """
+        Image, ImageDraw, ImageFont = pil()
+        tile_size = self.tile_size
+        width, height = self._tile_size(level, col, row)
+        merged = Image.new('RGB', (2*width, 2*height), 
+                           color = self.background)
+        for i in (0, 1):
+            for j in (0, 1):
+                filepath = self._filepath(level - 1, 2*col + i, 2*row + j)
+                if os.path.exists(filepath):
+                    with Image.open(filepath) as child:
+                        merged.paste(child, (i*tile_size, j*tile_size))
+        merged.reduce(2).save(self._filepath(level, col, row))
+    
+    @log.traced
+    def end(self, trace = None):
+        from concurrent.futures import ThreadPoolExecutor
+        level = 0
+        with ThreadPoolExecutor(max_workers = self.workers) as executor:
+            while True:
+                os.makedirs(os.path.join(self.directory, str(level)), 
+                            exist_ok = True)
+                grid = self._grid(level)
+                if level == 0:
+                    tasks = [executor.submit(self.render_tile, col, row)
+                             for col, row in grid]
+                else:
+                    tasks = [executor.submit(self.render_parent, level, 
+                                             col, row)
+                             for col, row in grid]
+                for task in tasks:
+                    task.result()
+                self.written[level] = len(grid)
+                
+                level += 1
+                if ((self.levels is None and len(grid) <= 1) or
+                    (not self.levels is None and level >= self.levels)):
+                    break
+        #the shapes are no longer needed once every tile is written
+        self.shapes = []
+        self.index = SpatialIndex(cell_size = self.tile_size)
 
 class FlowDiagram:
+    """
+    Diagram of the nodes, containers and connections of a workflow. Shapes
+    are drawn by a backend, by default a RasterBackend drawing to an
+    in-memory image. Passing an SVGBackend instead writes the diagram to
+    an SVG file as it is drawn, and a TiledBackend renders it as tiles.
+    
+    If a viewport (x1, y1, x2, y2) in diagram coordinates is given, only
+    that part of the diagram is drawn, and only the nodes, containers and
+    connectors within it are drawn at all.
+    """
     scale = 2
     node_height = 50*scale
     node_width = node_height
@@ -45,208 +532,283 @@ class FlowDiagram:
                               }
     background = 'white'
     border = node_width
-    font = ImageFont.truetype("arial.ttf", 18)
-    def __init__(self, workflow, trace = None):
-        log.log_trace(self, "__init__", trace)
-        inf_trace = {"source": "function call", 
-                     "parent": self.__class__.__name__ + ".__init__"}
+    font_name = "arial.ttf"
+    font_size = 18
+    @log.traced
+    def __init__(self, workflow, trace = None, backend = None,
+                 viewport = None):
         """
         Initialise a new flow diagram canvas to add nodes and connections to.
         """
         self.workflow = workflow
-        for n in self.workflow.nodes:
-            n.x = n.x*self.scale
-            n.y = n.y*self.scale
-            
-        for c in self.workflow.containers:
-            c.x = c.x*self.scale
-            c.y = c.y*self.scale
-            c.width = c.width*self.scale
-            c.height = c.height*self.scale
-                
-        self.x_offset = -1*min(workflow.nodes.attr('x')) + self.border
-        self.y_offset = -1*min(workflow.nodes.attr('y')) + self.border
-        
-        for n in self.workflow.nodes:
-            n.x += self.x_offset
-            n.y += self.y_offset     
-        for c in self.workflow.containers:
-            c.x += self.x_offset
-            c.y += self.y_offset
-                
-        x_max = max(workflow.nodes.attr('x')) + self.node_width + self.border
+        self.backend = RasterBackend() if backend is None else backend
+        self.viewport = viewport
+        self.layout = Layout(workflow, scale = self.scale,
+                             border = self.border,
+                             node_width = self.node_width,
+                             node_height = self.node_height,
+                             container_padding = self.container_padding)
+        self.x_offset = self.layout.x_offset
+        self.y_offset = self.layout.y_offset
         
-        y_max = max(workflow.nodes.attr('y')) + self.node_height + self.border
+        if viewport is None:
+            size = self.layout.size
+            visible = None
+            lines = self.connector_geometry()
+        else:
+            x1, y1, x2, y2 = viewport
+            size = (x2 - x1, y2 - y1)
+            self.backend.origin = (x1, y1)
+            #labels can be drawn outside the box of their node
+            margin = self._label_margin()
+            visible = set(self.layout.index.query(
+                (x1 - margin, y1 - margin, x2 + margin, y2 + margin)))
+            margin = self.connection_thickness
+            lines = [line for line in self.connector_geometry()
+                     if intersects(bounding_box(line, margin), viewport)]
         
-        self.canvas = Image.new('RGB', (x_max, y_max), color = 'white')
-        self.draw = ImageDraw.Draw(self.canvas)
+        self.backend.begin(size, self.background)
         
         for c in self.workflow.containers:
-            self.draw_container(c, trace = inf_trace)
+            if visible is None or c.id in visible:
+                self.draw_container(c)
      
-        for n in self.workflow.nodes:
-            if n.is_container:
-                pass
-            else:
-                self.draw_node(n, trace = inf_trace)
-            
-        for c in self.workflow.connections:
-            if c.wireless:
-                pass
-            else:
-                self.draw_connector(c, trace = inf_trace)
+        for n, box in self.node_geometry():
+            if visible is None or n.id in visible:
+                self.draw_node(n, box = box)
         
+        self.draw_connectors(lines)
+        self.backend.end()
+        
+    @property
+    def canvas(self):
+        """
+        Image drawn by a raster backend
+        """
+        return self.backend.canvas
+    
+    @property
+    def draw(self):
+        return self.backend.draw
         
+    def _label_margin(self):
+        """
+        Return the furthest that the label of any node or container can be
+        drawn outside of its box, assuming no character is wider than the
+        font size
+        """
+        labels = [n.type for n in self.workflow.nodes if not n.is_container]
+        labels += [c.id + " " + c.caption for c in self.workflow.containers]
+        longest = max((len(label) for label in labels), default = 0)
+        return longest*self.font_size + 2*self.node_thickness
+    
+    @log.traced
+    def node_at(self, x, y, trace = None):
+        """
+        Return the Node or Container object drawn at the given diagram 
+        coordinates, or None if there is none
+        """
+        node_id = self.layout.index.at(x, y)
+        if node_id is None:
+            return None
+        containers_dict = self.workflow.containers.containers_dict
+        if node_id in containers_dict:
+            return containers_dict[node_id]
+        return self.workflow.nodes.get_node(node_id)
+    
+    @log.traced
     def _node_coords(self, n, trace = None):
-        log.log_trace(self, "draw_node", trace)
         """
         Get the coordinates for a given node object
         """
-        x1 = n.x
-        y1 = n.y
+        x1, y1 = self.layout.nodes[n.id]
         x2 = x1 + self.node_width
         y2 = y1 + self.node_height
         return (x1, y1, x2, y2)
     
+    @log.traced
     def _container_coords(self, c, trace = None):
-        log.log_trace(self, "draw_node", trace)
         """
-        Get the coordinates for a given node object
+        Get the coordinates for a given container object
         """
-        x1 = c.x
-        y1 = c.y
-        x2 = x1 + c.width + self.container_padding
-        y2 = y1 + c.height + self.container_padding
+        x1, y1, width, height = self.layout.containers[c.id]
+        x2 = x1 + width + self.container_padding
+        y2 = y1 + height + self.container_padding
         return (x1, y1, x2, y2)
         
-    def draw_node(self, n, trace = None):
-        log.log_trace(self, "draw_node", trace)
-        inf_trace = {"source": "function call", 
-                     "parent": self.__class__.__name__ + ".draw_node"}
+    @log.traced
+    def node_geometry(self, trace = None):
         """
-        Add a node to the canvas from a Node object
+        Return a list of (Node object, (x1, y1, x2, y2)) of every node drawn
+        on the diagram, i.e. every node except containers
         """
-        x1, y1, x2, y2 = self._node_coords(n, inf_trace)
+        nodes = self.layout.nodes
+        width, height = self.node_width, self.node_height
+        geometry = []
+        for n in self.workflow.nodes:
+            if n.is_container: continue
+            x1, y1 = nodes[n.id]
+            geometry.append((n, (x1, y1, x1 + width, y1 + height)))
+        return geometry
+        
+    @log.traced
+    def draw_node(self, n, trace = None, box = None):
+        """
+        Add a node to the canvas from a Node object, optionally with its
+        coordinates if already known
+        """
+        x1, y1, x2, y2 = self._node_coords(n) if box is None else box
         self._square([(x1, y1), (x1, y2), (x2, y2), (x2, y1)])
         self._text((x1, y1 - 2*self.node_thickness), n.type)
         self._text((x1 + self.node_thickness, y1 + 2*self.node_thickness), n.id)
         
+    @log.traced
     def draw_container(self, c, trace = None):
-        log.log_trace(self, "draw_container", trace)
-        inf_trace = {"source": "function call", 
-                     "parent": self.__class__.__name__ + ".draw_container"}
         """
         Add a container to the canvas from a Container object
         """
-        x1, y1, x2, y2 = self._container_coords(c, inf_trace)
+        x1, y1, x2, y2 = self._container_coords(c)
         self._box(vertices = [(x1, y1), (x1, y2), (x2, y2), (x2, y1)],
                   outline = c.border_colour,
                   fill = c.fill_colour,
-                  width = self.container_thickness,
-                  trace = inf_trace)
+                  width = self.container_thickness)
         self._text((x1 + self.container_thickness, 
                     y1 + self.container_thickness), 
                    c.id + " " + c.caption)
         
+    @log.traced
     def _square(self, vertices, colour = 'black', width = None, trace = None):
-        log.log_trace(self, "_square", trace)
         """
         Draw a polygon with rounded edges between the given vertices
         """
         width = self.node_thickness if width is None else width
-        vertices += vertices
-        self.draw.line(vertices, fill = colour, 
-                       width = width, joint = "curve")
+        self.backend.outline(vertices, colour, width)
         
+    @log.traced
     def _box(self, vertices, outline, fill, width = None, trace = None):
-        log.log_trace(self, "_square", trace)
-        inf_trace = {"source": "function call", 
-                     "parent": self.__class__.__name__ + "._box"}
         """
         Draw a filled polygon with rounded edges between the given vertices
         """
         width = self.node_thickness if width is None else width
-        vertices += vertices
-        
-        self.draw.rectangle([vertices[0], vertices[2]], 
-                            fill, outline, width)
-        self._square(vertices, colour = outline, 
-                     width = width, trace = inf_trace)
+        self.backend.box(vertices, outline, fill, width)
         
+    @log.traced
     def _text(self, xy, text, colour = 'black', trace = None):
-        log.log_trace(self, "_square", trace)
         """
         Add text to the canvas at the given coordinates
         """
-        self.draw.text(xy, text, colour, font = self.font)
+        self.backend.text(xy, text, colour, self.font_name, self.font_size)
         
+    @log.traced
     def draw_connector(self, c, split = True, colour = 'black', 
                        width = None, trace = None):
-        log.log_trace(self, "draw_connector", trace)
-        inf_trace = {"source": "function call", 
-                     "parent": self.__class__.__name__ + ".draw_connector"}
         """
         Add a connector to the canvas from a Connector object
         """
+        self.draw_connectors(self.connector_geometry([c], split = split),
+                             colour = colour, width = width)
+        
+    @log.traced
+    def draw_connectors(self, lines, colour = 'black', width = None,
+                        trace = None):
+        """
+        Add a batch of connectors to the canvas, given as a list of tuples
+        of the vertices of each line
+        """
         width = self.connection_thickness if width is None else width
-        coords = self._connection_coords(c, trace = inf_trace)
-        if split:
-            x1, y1, x2, y2 = (coords[0][0], coords[0][1], 
-                              coords[1][0], coords[1][1])
-            
-            split_coords = ((x1, y1), (int((x1+x2)/2), y1), 
-                            (int((x1+x2)/2), y2), (x2, y2))
-            
-            self.draw.line(split_coords, fill = colour, 
-                           width = width, joint="curve")
-        else:
-            self.draw.line(coords, fill = colour, width = width)
+        self.backend.lines(lines, colour, width)
         
-    def _connection_coords(self, c, trace = None):
-        log.log_trace(self, "draw_connector", trace)
-        inf_trace = {"source": "function call", 
-                     "parent": self.__class__.__name__ + "._connection_coords"}
+    def _connection_type_offsets(self, direction):
         """
-        Get the coordinates of the start and end of a connection
+        Return a dictionary of connection type to the vertical offset of
+        connections of that type on the given side ("input" or "output")
+        of a node
         """
-        start_node = self.workflow.nodes.get_node(c.origin.id)
-        end_node = self.workflow.nodes.get_node(c.destination.id)
+        offsets = self.connection_offsets
+        return {connection_type: offsets[off[1]][off[0]]
+                for connection_type, off 
+                in self.connection_type_offset[direction].items()}
         
-        coords = [[start_node.x, start_node.y],
-                  [end_node.x, end_node.y]]
-        if start_node.is_container:
-            coords_offset = [[150, 0], [0, 0]]
-        else:
-            coords_offset = [[self.node_width, 0], [0, 0]]
+    @cached_property
+    def anchors(self):
+        """
+        Dictionary of ToolID to the (x, y) of the top left of every node and
+        container, and the x of its right edge, where connectors leave it.
+        Built in one pass over the layout, which never changes.
+        """
+        node_width = self.node_width
+        container_ids = self.layout.container_ids
+        anchors = {}
+        for node_id, (x, y) in self.layout.nodes.items():
+            anchors[node_id] = (x, y, x + (150 if node_id in container_ids
+                                           else node_width))
+        #containers are positioned from their Container object
+        for node_id, (x, y, width, height) in self.layout.containers.items():
+            anchors[node_id] = (x, y, x + 150)
+        return anchors
+    
+    @log.traced
+    def connector_geometry(self, connections = None, split = True,
+                           trace = None):
+        """
+        Return the vertices of the line of each of the given connections,
+        or by default every connection that is not wireless, as a list of 
+        tuples. Lines are split into horizontal and vertical segments
+        unless split is False, in which case they are only the start and
+        end of the connection.
+        
+        The vertical offsets of each connection type are looked up once for
+        the whole batch, and the ends of each line are read from anchors,
+        so each connection only takes two lookups and no method calls.
+        """
+        if connections is None:
+            connections = [c for c in self.workflow.connections
+                           if not c.wireless]
         
-        """ offset the connection start/end vertically based on the type of 
-        connection """
-        off = self.connection_type_offset["output"].get(c.origin.type, (0, 1))
-        coords_offset[0][1] = self.connection_offsets[off[1]][off[0]]
+        anchors = self.anchors
+        default_offset = self.connection_offsets[1][0]
+        output_offsets = self._connection_type_offsets("output")
+        input_offsets = self._connection_type_offsets("input")
         
-        off = self.connection_type_offset["input"].get(c.destination.type, (0, 1))
-        coords_offset[1][1] = self.connection_offsets[off[1]][off[0]]
+        lines = []
+        for c in connections:
+            origin, destination = c.origin, c.destination
+            _, y1, x1 = anchors[origin.id]
+            x2, y2, _ = anchors[destination.id]
+            y1 += output_offsets.get(origin.type, default_offset)
+            y2 += input_offsets.get(destination.type, default_offset)
+            if split:
+                x_mid = int((x1 + x2)/2)
+                lines.append(((x1, y1), (x_mid, y1), (x_mid, y2), (x2, y2)))
+            else:
+                lines.append(((x1, y1), (x2, y2)))
+        return lines
         
-        for i in [0, 1]:
-            coords[i] = self._offset(coords[i], coords_offset[i], inf_trace)
-            
-        return tuple(coords)
+    @log.traced
+    def _connection_coords(self, c, trace = None):
+        """
+        Get the coordinates of the start and end of a connection
+        """
+        return self.connector_geometry([c], split = False)[0]
         
-    def _offset(self, xy, offset_xy, trace = None):
-        log.log_trace(self, "draw_connector", trace)
-        return(tuple(xy[i] + offset_xy[i] for i in range(len(xy))))
-    
+    @log.traced
     def show(self, trace = None):
-        log.log_trace(self, "show", trace)
         self.canvas.show()
         
+    @property
+    def font(self):
+        return text_cache.font(self.font_name, self.font_size)
+        
+    @log.traced
     def save(self, trace = None):
-        log.log_trace(self, "save", trace)
+        from datetime import datetime
         str_dt = datetime.now().strftime("%Y-%m-%d %H.%M.%S")
         filename = "%s %s.png" % (self.workflow.name, str_dt)
         self.canvas.save(".\Images\%s" % filename)
         
 if __name__ == "__main__":
+    from mountain_view_alteryx import Workflow
+    
     workflow = Workflow("..\\Workflows\\ar-sc.txt",
                         trace = {"source": "initialise class", 
                                  "parent": __name__})
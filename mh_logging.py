@@ -5,49 +5,268 @@ Created on Thu Jul 29 23:40:24 2021
 @author: marcu
 """
 
-from datetime import datetime
+from functools import wraps
+from collections import deque
+import os
+import sys
+import threading
+import time
+
+class TraceSink:
+    """
+    Bounded in-memory ring buffer of trace records, drained by a background
+    thread to a JSON lines file and/or stdout.
+
+    Emitting a record only appends a tuple to the buffer, so tracing can be
+    left on without the caller waiting on any I/O. If the writer falls
+    behind and the buffer fills, the oldest records are overwritten and
+    counted in dropped.
+
+    A forked child process does not inherit the writer thread, so Logging
+    replaces a sink used after a fork with a new one for the child, which
+    appends to the same file.
+    """
+    def __init__(self, filepath = None, stdout = False, max_records = 65536,
+                 flush_interval = 0.5):
+        self.filepath = filepath
+        self.stdout = stdout
+        self.max_records = max_records
+        self.flush_interval = flush_interval
+        self.buffer = deque(maxlen = max_records)
+        self.dropped = 0
+        #process the writer thread is running in
+        self.pid = os.getpid()
+        self._file = (None if filepath is None else
+                      open(filepath, "a", encoding = "utf-8"))
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target = self._run,
+                                        name = "TraceSink", daemon = True)
+        self._thread.start()
+        import atexit
+        atexit.register(self.close)
+
+    def for_child(self):
+        """
+        Return a new sink with the same settings, for a forked child
+        process
+        """
+        return TraceSink(filepath = self.filepath, stdout = self.stdout,
+                         max_records = self.max_records,
+                         flush_interval = self.flush_interval)
+
+    def emit(self, record):
+        """
+        Add a record tuple of (timestamp, function, parent, source,
+        duration, extra) to the buffer
+        """
+        if len(self.buffer) == self.max_records:
+            self.dropped += 1
+        self.buffer.append(record)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """
+        Write out every record currently in the buffer
+        """
+        import json
+        with self._lock:
+            lines = []
+            texts = []
+            while True:
+                try:
+                    record = self.buffer.popleft()
+                except IndexError:
+                    break
+                if not self._file is None:
+                    lines.append(json.dumps(self.to_dict(record)) + "\n")
+                if self.stdout:
+                    texts.append(self.to_text(record) + "\n")
+            if lines:
+                self._file.writelines(lines)
+                self._file.flush()
+            if texts:
+                sys.stdout.writelines(texts)
+                sys.stdout.flush()
+
+    def close(self):
+        """
+        Stop the writer thread and write out any remaining records
+        """
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+        if not self._file is None:
+            self._file.close()
+
+    @staticmethod
+    def to_dict(record):
+        timestamp, function, parent, source, duration, extra = record
+        d = {"timestamp": timestamp, "function": function, "parent": parent,
+             "source": source, "duration": duration}
+        if not extra is None:
+            d.update(extra)
+        return d
+
+    @staticmethod
+    def to_text(record):
+        from datetime import datetime
+        timestamp, function, parent, source, duration, extra = record
+        extra = {} if extra is None else extra
+        prnt = str(datetime.fromtimestamp(timestamp))
+        if source == "bound event":
+            prnt += " Called %s from widget %s and event %s." % (
+                function, extra.get("widget"), extra.get("event"))
+        elif source == "function call":
+            prnt += " Called %s from within %s." % (function, parent)
+        elif source == "initialise class":
+            prnt += " Initialised class %s from within %s." % (function,
+                                                               parent)
+        else:
+            prnt += " Called %s without trace." % function
+        if not duration is None:
+            prnt += " (%.3f ms)" % (duration*1000)
+        if extra.get("add"):
+            prnt += " %s" % extra["add"]
+        return prnt
 
 class Logging:
-    def __init__(self, parent, testing_mode = True, trace = None):
+    """
+    Trace the calls made between methods. Functions opt in with the traced
+    decorator, which only wraps them if logging is enabled when they are
+    decorated, so tracing costs nothing when it is disabled. Trace records
+    are sent to a TraceSink, which writes them from a background thread.
+    """
+    def __init__(self, parent, testing_mode = True, trace = None,
+                 sink = None):
         self.p = parent
         self.log = testing_mode
+        #a sink printing to stdout is created on first use if none is given
+        self.sink = sink
+        #names of the traced functions currently being called in each
+        #thread, innermost last
+        self._local = threading.local()
         self.log_trace(self, "__init__", trace)
         return
 
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _emit(self, record):
+        sink = self.sink
+        if sink is None:
+            sink = self.sink = TraceSink(stdout = True)
+        elif sink.pid != os.getpid():
+            #forked since the sink was created, so its writer thread does
+            #not exist in this process
+            sink = self.sink = sink.for_child()
+        sink.emit(record)
+
+    def flush(self):
+        """
+        Write out any buffered trace records. Must be called before a
+        process exits without running atexit handlers, e.g. a process pool
+        worker.
+        """
+        if not self.sink is None and self.sink.pid == os.getpid():
+            self.sink.flush()
+
+    def traced(self, function):
+        """
+        Decorator logging each call to a function or method, with how long
+        it took. The function it was called from within is taken from the
+        stack of traced calls, unless a trace dict is passed explicitly as
+        the trace argument.
+        """
+        if not self.log:
+            return function
+
+        name = function.__name__
+        is_method = "." in function.__qualname__
+        module = function.__module__
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            parent = args[0] if is_method and args else module
+            function_name = self._function_name(parent, name)
+            stack = self._stack()
+            trace = kwargs.get("trace", None)
+            if trace is None and stack:
+                source, caller = "function call", stack[-1]
+            elif trace is None:
+                source, caller = None, None
+            else:
+                source, caller = trace.get("source"), trace.get("parent")
+
+            stack.append(function_name)
+            timestamp = time.time()
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                duration = time.perf_counter() - start
+                stack.pop()
+                self._emit((timestamp, function_name, caller, source,
+                            duration, None))
+        return wrapper
+
+    def _function_name(self, parent, function):
+        if parent is None:
+            return function
+        elif type(parent) is str:
+            return parent + "." + function
+        else:
+            return parent.__class__.__name__ + "." + function
+
     def log_trace(self, parent, function, trace, add = ""):
         if self.log:
             trace = {"source": None, "widget": None, "parent": None
                      } if trace is None else trace
-            
-            if parent is None:
-                trace["function"] = function
-            if type(parent) is str:
-                trace["function"] = parent + "." + function
-            else:
-                trace["function"] = parent.__class__.__name__ + "." + function
-            
-            if trace["source"] == "bound event":
-                trace_tuple = (datetime.now(), trace["function"], 
-                               trace["widget"], trace["event"])
-                prnt = "%s Called %s from widget %s and event %s." % trace_tuple
-                
-            elif trace["source"] == "function call":
-                trace_tuple = (datetime.now(), trace["function"], 
-                               trace["parent"])
-                prnt = "%s Called %s from within %s." % trace_tuple
-                
-            elif trace["source"] == "initialise class":
-                trace_tuple = (datetime.now(), parent.__class__.__name__, 
-                               trace["parent"])
-                prnt = "%s Initialised class %s from within %s." % trace_tuple
-                
+
+            trace["function"] = self._function_name(parent, function)
+            source = trace.get("source")
+            extra = {"add": add} if add else None
+
+            if source == "bound event":
+                extra = dict(extra or {}, widget = trace["widget"],
+                             event = trace["event"])
+                record = (time.time(), trace["function"], None, source,
+                          None, extra)
+
+            elif source == "initialise class":
+                record = (time.time(), parent.__class__.__name__,
+                          trace["parent"], source, None, extra)
+
             else:
-                trace_tuple = (datetime.now(), trace["function"])
-                prnt = "%s Called %s without trace." % trace_tuple
-                
-            prnt += " %s" % add
-            print(prnt)
+                record = (time.time(), trace["function"],
+                          trace.get("parent"), source, None, extra)
+
+            self._emit(record)
         return
 
-log = Logging(__name__, testing_mode = False, 
-              trace = {"source": "initialise class", "parent": __name__})
\ No newline at end of file
+def _default_sink():
+    """
+    Sink configured from the environment. MH_LOGGING_FILE gives a JSON lines
+    file to write records to, and MH_LOGGING_STDOUT=1 also prints them.
+    Records are printed if no file is given.
+    """
+    filepath = os.environ.get("MH_LOGGING_FILE", None) or None
+    stdout = (filepath is None or
+              os.environ.get("MH_LOGGING_STDOUT", "0") == "1")
+    return TraceSink(filepath = filepath, stdout = stdout)
+
+#tracing is enabled by setting MH_LOGGING=1 in the environment before any of
+#the traced modules are imported
+_enabled = os.environ.get("MH_LOGGING", "0") == "1"
+log = Logging(__name__,
+              testing_mode = _enabled,
+              sink = _default_sink() if _enabled else None,
+              trace = {"source": "initialise class", "parent": __name__})
@@ -8,11 +8,13 @@ Created on Wed Jul 28 21:44:21 2021
 import xml.etree.ElementTree as et
 from mh_logging import log
 from nodes import Nodes, Node
-from connections import Connections
-from containers import Containers
-import mv_formulas as mvf
-from copy import deepcopy
+from connections import Connections, Connection
+from containers import Containers, Container
+from mv_stats import Stats
+from functools import cached_property
 from os import path
+#the formula analysis, field index, extractors and copying are imported when
+#first used, as opening a workflow does not need them
 # from flow_diagram import FlowDiagram
 
 class Workflow:
@@ -23,258 +25,366 @@ class Workflow:
 
     # meta_workflows = {}
 
-    def __init__(self, filepath, trace = None):
-        inf_trace = {"source": "function call",
-                     "parent": self.name + ".__init__"}
-        log.log_trace(self, "__init__", trace)
+    #registry of the extractors used to find the formulas, filters and
+    #selections of each type of node. None uses extractors.extractors.
+    extractors = None
+
+    #attributes stored in and restored from a ParseCache. The analyses are
+    #not cached, as they depend on the extractors and the formula tokenizer
+    #as well as the model, and are recomputed when first used
+    cache_attributes = ["version", "nodes", "connections", "containers"]
+
+    #analyses computed on first access, which are discarded by invalidate
+    lazy_attributes = ["formulas", "filters", "selections", "field_index",
+                       "input_nodes", "output_nodes", "node_flags"]
+
+    #lazy analyses which only depend on the configuration of each node, so
+    #are kept by invalidate when nodes are removed, less the removed nodes
+    node_attributes = ["formulas", "filters", "selections", "field_index"]
+
+    @log.traced
+    def __init__(self, filepath, trace = None, streaming = False,
+                 keep_raw_xml = None, slim = False, cache = None):
         """
         Initiliase the Workflow object by parsing the given filepath as XML
+
+        If streaming is True, the file is read incrementally with iterparse
+        and the full ElementTree is never held in memory. If keep_raw_xml is
+        True, the text of the file is kept in self.raw_xml, and if it is
+        False it is not. It defaults to True, except when streaming, as the
+        text would take more memory than the streaming parse saves. When
+        streaming with keep_raw_xml True, the text is read from the file
+        after parsing rather than parsed from, so the two are never held in
+        memory together. If slim is True, the nodes, connections and
+        containers keep no references to the parsed XML, so it can be freed
+        as soon as loading finishes.
+
+        If a ParseCache is given as cache, slim is always True, as a cached
+        model cannot reference the XML. The nodes, connections and
+        containers are loaded from the cache when the file is unchanged,
+        skipping XML parsing entirely. Otherwise the file is parsed and they
+        are stored in the cache. The analyses below are never cached.
+
+        The formulas, filters, selections, field index, input and output
+        nodes and the is_input, is_output and is_multi_connection flags of
+        the nodes are only computed when first used. Accessing node_flags
+        makes sure the flags are set.
+
+        The time, allocations and object counts of each phase of loading
+        are recorded in self.stats.
         """
+        self.name = path.splitext(path.basename(filepath))[0]
+        self.stats = stats = Stats()
+        stats.start()
         self.nodes = []
         self.connections = []
         self.containers = []
         self.xml = None
-        self.name = self.__class__.__name__
+        self.raw_xml = None
         self.filepath = filepath
-        self.name = path.splitext(path.basename(filepath))[0]
-
-        with open(filepath, 'r') as ayx:
-            self.raw_xml = ayx.read()
-
-        self.xml = et.fromstring(self.raw_xml)
+        self.slim = slim or not cache is None
+
+        if keep_raw_xml is None:
+            keep_raw_xml = not streaming
+        if keep_raw_xml and not streaming:
+            self._read_raw_xml()
+
+        if not cache is None:
+            model = cache.get(filepath)
+            stats.lap("cache_get")
+            if not model is None:
+                self.__dict__.update(model)
+                if keep_raw_xml and streaming:
+                    self._read_raw_xml()
+                stats.count("cache_hits")
+                self._count_objects()
+                return
+
+        if streaming:
+            self.iterparse(filepath)
+            stats.lap("iterparse")
+            if keep_raw_xml:
+                self._read_raw_xml()
+        else:
+            if self.raw_xml is None:
+                self.xml = et.parse(filepath).getroot()
+            else:
+                self.xml = et.fromstring(self.raw_xml)
+            stats.lap("parse")
 
-        self.version = self.xml.attrib["yxmdVer"]
+            self.version = self.xml.attrib["yxmdVer"]
 
-        self.nodes = Nodes(self.xml, trace = inf_trace)
-        self.connections = Connections(self.xml, trace = inf_trace)
-        self.containers = Containers(self.xml, trace = inf_trace)
+            self.map_nodes(self.xml)
+            stats.lap("nodes")
+            self.connections = Connections(self.xml, slim = self.slim)
+            stats.lap("connections")
+            if self.slim:
+                self.xml = None
 
         for c in self.containers:
             #Add nodes within containers. These are contained within the
-            #ChildNodes tag within the container Node
+            #ChildNodes tag within the container Node, and have already been
+            #created by the Container object
             if not c.disabled:
-                self.nodes.add_nodes(xml = c.child_nodes_xml,
-                                     parent_node = c,
-                                     trace = inf_trace)
-
-        self.formulas = self.get_formulas(trace = inf_trace)
-        self.filters = self.get_filters(trace = inf_trace)
-        self.selections = self.get_selections(trace = inf_trace)
-        self.map_input_nodes(trace = inf_trace)
-        self.map_output_nodes(trace = inf_trace)
-        self.map_defined_input_nodes(trace = inf_trace)
-        self.map_defined_output_nodes(trace = inf_trace)
+                for n in c.nodes:
+                    self.nodes.add_node(n, parent_node = c)
+        stats.lap("container_nodes")
+
+        if not cache is None:
+            cache.put(filepath,
+                      {a: getattr(self, a) for a in self.cache_attributes})
+            stats.lap("cache_put")
+        self._count_objects()
+
+    def _read_raw_xml(self):
+        with open(self.filepath, 'r') as ayx:
+            self.raw_xml = ayx.read()
+        self.stats.lap("read")
 
-        for n in self.nodes:
-            n.is_multi_connection = self.connections.is_node_multiconnection(n.id)
+    def _count_objects(self):
+        """
+        Record the number of each type of object in the workflow in 
+        self.stats
+        """
+        stats = self.stats
+        stats.count("workflows")
+        stats.count("nodes", self.nodes.count)
+        stats.count("connections", self.connections.count)
+        stats.count("containers", self.containers.count)
+
+    def _extract_all(self):
+        with self.stats.phase("extract"):
+            extracted = self.extract()
+        self.formulas = extracted["formulas"]
+        self.filters = extracted["filters"]
+        self.selections = extracted["selections"]
+        self.stats.count("formulas", len(self.formulas))
+        self.stats.count("filters", len(self.filters))
+        self.stats.count("selections", len(self.selections))
+        return extracted
+
+    @cached_property
+    def formulas(self):
+        return self._extract_all()["formulas"]
+
+    @cached_property
+    def filters(self):
+        return self._extract_all()["filters"]
+
+    @cached_property
+    def selections(self):
+        return self._extract_all()["selections"]
+
+    @cached_property
+    def field_index(self):
+        #extract first, so the extract phase is not also counted in this one
+        self.formulas
+        with self.stats.phase("field_index"):
+            index = self.map_fields()
+        self.stats.count("fields", index.count)
+        return index
+
+    @cached_property
+    def node_flags(self):
+        """
+        True once the is_input, is_output, is_defined_input, 
+        is_defined_output and is_multi_connection flags of every node have
+        been set
+        """
+        with self.stats.phase("node_flags"):
+            self.map_input_nodes()
+            self.map_output_nodes()
+            self.map_defined_input_nodes()
+            self.map_defined_output_nodes()
+            self.map_multi_connection_nodes()
+        return True
+
+    @cached_property
+    def input_nodes(self):
+        self.node_flags
+        return [n for n in self.nodes if n.is_input]
+
+    @cached_property
+    def output_nodes(self):
+        self.node_flags
+        return [n for n in self.nodes if n.is_output]
+
+    @log.traced
+    def invalidate(self, node_ids = None, trace = None):
+        """
+        Discard the analyses of the workflow after it has been modified, so
+        they are recomputed when next used. If a list of node ids is given,
+        only the flags of those nodes are recomputed instead of the flags of
+        every node, and any of them which have been removed are dropped from
+        the formulas, filters, selections and field index rather than those
+        being extracted again.
+        """
+        for attr in self.lazy_attributes:
+            if (not node_ids is None and 
+                (attr == "node_flags" or attr in self.node_attributes)):
+                continue
+            self.__dict__.pop(attr, None)
+        if node_ids is None:
+            return
+
+        removed = set(nid for nid in node_ids
+                      if not nid in self.nodes.nodes_dict)
+        if removed:
+            for attr in ["formulas", "filters", "selections"]:
+                if attr in self.__dict__:
+                    self.__dict__[attr] = [f for f in self.__dict__[attr]
+                                           if not f["node"].id in removed]
+            if "field_index" in self.__dict__:
+                for nid in removed:
+                    self.field_index.remove_node(nid)
+        if "node_flags" in self.__dict__:
+            for nid in node_ids:
+                if nid in self.nodes.nodes_dict:
+                    self._map_node_flags(self.nodes.get_node(nid))
+
+    def _map_node_flags(self, n):
+        """
+        Set the connection flags of a single node, as map_input_nodes,
+        map_output_nodes and map_multi_connection_nodes do for every node
+        """
+        n.is_input = (self.connections.previous_node(n.id) == []
+                      and not n.is_decorator)
+        n.is_output = (self.connections.next_node(n.id) == [] and
+                       not n.is_decorator and not n.is_browse)
+        n.is_multi_connection = self.connections.is_node_multiconnection(n.id)
+
+    @log.traced
+    def map_nodes(self, xml, trace = None):
+        """
+        Populate the nodes and containers of the workflow in a single pass
+        over the top-level Node elements of a given ElementTree xml object
+        """
+        self.nodes = Nodes(None)
+        self.containers = Containers(None)
+        for n in xml.findall("Nodes/Node"):
+            self.add_node_xml(n)
 
+    @log.traced
+    def add_node_xml(self, xml, trace = None):
+        """
+        Create the Node or Container object for a top-level Node element and
+        register it with the workflow. Containers are registered as both a
+        node and a container, using the same object.
+        """
+        plugin = xml.find("GuiSettings").attrib.get("Plugin", None)
+        if plugin == "AlteryxGuiToolkit.ToolContainer.ToolContainer":
+            node = Container(xml, slim = self.slim)
+            self.containers.add(node)
+        else:
+            node = Node(xml, slim = self.slim)
+        self.nodes.add_node(node)
+        return node
+
+    @log.traced
+    def iterparse(self, source, trace = None):
+        """
+        Populate the nodes, connections and containers of the workflow from
+        a file path or file object without building the full ElementTree.
+
+        Each top-level Node and Connection is converted to its object as soon
+        as its closing tag is read, and the element is then detached from the
+        document so the parsed tree never grows beyond a single tool.
+        """
+        self.nodes = Nodes(None)
+        self.connections = Connections(None)
+        self.containers = Containers(None)
+
+        #stack of currently open elements, root first
+        stack = []
+        for event, elem in et.iterparse(source, events = ("start", "end")):
+            if event == "start":
+                if not stack:
+                    self.version = elem.attrib["yxmdVer"]
+                stack.append(elem)
+                continue
+
+            stack.pop()
+            depth = len(stack)
+            if depth == 2 and elem.tag == "Node" and stack[1].tag == "Nodes":
+                self.add_node_xml(elem)
+                if self.slim:
+                    elem.clear()
+            elif (depth == 2 and elem.tag == "Connection" and
+                  stack[1].tag == "Connections"):
+                self.connections.add(Connection(elem, slim = self.slim))
+                if self.slim:
+                    elem.clear()
+            elif depth != 1:
+                continue
+            #the element has been consumed, so drop it from its parent
+            stack[-1].remove(elem)
+
+    @log.traced
+    def extract(self, trace = None):
+        """
+        Extract the formulas, filters and selections of the workflow in a
+        single pass over the nodes, using the extractors registered for each
+        node type. Returns a dictionary of collection name to list.
+        """
+        registry = self.extractors
+        if registry is None:
+            from extractors import extractors as registry
+        return registry.extract(self.nodes)
+
+    @log.traced
     def get_formulas(self, trace = None):
-        log.log_trace(self, "get_formulas", trace)
         """
         Extract a list of Formula dictionaries. Used to decide which fields to
         analyse in the documentation.
         """
-        arr_formulas = []
-        for n in self.nodes:
-            if n.is_decorator: continue
-            if n.is_macro: continue
-
-            if (n.type == 'AlteryxBasePluginsGui.Formula.Formula' or
-                n.type == 'LockInGui.LockInFormula.LockInFormula'):
-
-                formulas = n.config.find('FormulaFields').findall('FormulaField')
-                for i in range(len(formulas)):
-                    f = formulas[i]
-                    fdict = {'id': n.id,
-                             'node': n,
-                             'order_in_node': i,
-                             'field': f.attrib['field'],
-                             'expression': f.attrib['expression'],
-                             'type': f.attrib['type'],
-                             'size': f.attrib.get('size', None),
-                             'context': None
-                             }
-                    arr_formulas.append(fdict)
-
-            elif n.type == 'AlteryxBasePluginsGui.MultiRowFormula.MultiRowFormula':
-                fdict = {'id': n.id,
-                         'node': n,
-                         'order_in_node': 0,
-                         'field': None,
-                         'expression': None,
-                         'type': None,
-                         'size': None,
-                         'context': None
-                         }
-
-                fdict['expression'] = n.config.find("Expression").attrib.get('value',
-                                                                             None)
-
-                if n.config.find('UpdateField').attrib['value'] == 'True':
-                    fdict['field'] = n.config.find('UpdateField_Name').text
-                else:
-                    fdict['field'] = n.config.find('CreateField_Name').text
-                    fdict['type'] = n.config.find('CreateField_Type').text
-                    fdict['size'] = n.config.find('CreateField_Size').text
-                    fdict['context'] = {
-                        "Rows that don't exist:": n.config.find('OtherRows').text,
-                        'Group by': n.config.find('GroupByFields').text}
-                arr_formulas.append(fdict)
-
-            elif n.type == 'AlteryxBasePluginsGui.MultiFieldFormula.MultiFieldFormula':
-                fields = n.config.find("Fields")
-                for i in range(len(fields)):
-                    #selected keys have nothing. Unselected have selected =
-                    #"False"
-                    field = fields[i]
-                    try:
-                        if field.attrib["selected"] == "False":
-                            continue
-                    except KeyError:
-                        pass
-                    fdict = {'id': n.id,
-                             'node': n,
-                             'order_in_node': i,
-                             'field': field.attrib["name"],
-                             'expression': n.config.find('Expression').text,
-                             'type': None,
-                             'size': None,
-                             'context': None
-                             }
-                    if n.config.find('CopyOutput').attrib['value'] == 'True':
-                        pass #TODO
-                    else:
-                        pass #TODO
-                    arr_formulas.append(fdict)
-
-            elif n.type == 'AlteryxBasePluginsGui.DynamicRename.DynamicRename':
-                if n.config.find("RenameMode").text == "Formula":
-                    fdict = {'id': n.id,
-                             'node': n,
-                             'order_in_node': 0,
-                             'field': "__FieldName__",
-                             'expression': n.config.find("Expression").attrib.get("value",
-                                                                                  None),
-                             'type': None,
-                             'size': None,
-                             'context': None
-                             }
-                    arr_formulas.append(fdict)
-
-            elif n.type == 'AlteryxBasePluginsGui.GenerateRows.GenerateRows':
-                fdict = {'id': n.id,
-                         'node': n,
-                         'order_in_node': 0,
-                         'field': None,
-                         'expression': n.config.find('Expression_Loop').text,
-                         'type': None,
-                         'size': None,
-                         'context': {
-                             "Initial value": n.config.find('Expression_Init').text,
-                             "Loop condition:": n.config.find('Expression_Cond').text
-                             }
-                         }
-                if n.config.find("UpdateField").attrib["value"] == "True":
-                    fdict["field"] = n.config.find("UpdateField_Name").text
-                else:
-                    fdict["field"] = n.config.find("CreateField_Name").text
-                    fdict["type"] = n.config.find("CreateField_Type").text
-                    fdict["size"] = n.config.find("CreateField_Size").text
-                arr_formulas.append(fdict)
-
-            else:
-                continue
-        return arr_formulas
+        return self.extract()["formulas"]
 
+    @log.traced
     def get_filters(self, trace = None):
-        log.log_trace(self, "get_filters", trace)
         """
         Extract a list of Filter objects.
         """
-        filters = []
-        for n in self.nodes:
-            if (n.type == "AlteryxBasePluginsGui.Filter.Filter" or
-                n.type == "LockInGui.LockInFilter.LockInFilter"):
-
-                fdict = {'mode': n.config.find("Mode").text,
-                         'field': None,
-                         'expression': None
-                         }
-                if fdict['mode'] == 'Simple':
-                    try:
-                        fdict['field'] = n.config.find("Simple/Field").text
-                    except AttributeError:
-                        fdict['field'] = None
-                    fdict['expression'] = n.annotation.default_text
-                elif fdict['mode'] == 'Custom':
-                    fdict['expression'] = n.config.find("Expression").text
-                    fdict['field'] = mvf.fields_from_formula(fdict['expression'],
-                                                             trace = None)
-                filters.append(fdict)
-        return filters
+        return self.extract()["filters"]
 
+    @log.traced
     def get_selections(self, trace = None):
-        log.log_trace(self, "get_filters", trace)
         """
         Extract a list of Selection objects.
         """
-        selections = []
-        for n in self.nodes:
-            if (n.type == "AlteryxBasePluginsGui.AlteryxSelect.AlteryxSelect" or
-                n.type == "LockInGui.LockInSelect.LockInSelect"):
-
-                for field in n.config.findall("SelectFields/SelectField"):
-                    sdict = {'id': n.id,
-                             'node': n,
-                             'field': field.attrib["field"]}
-
-                    attributes = ['selected', 'rename', 'type', 'size']
-                    for attr in attributes:
-                        sdict[attr] = field.attrib.get(attr, None)
-
-                    if (sdict['selected'] == 'True' and sdict['rename'] is None
-                        and sdict['type'] is None and sdict['size'] is None):
-                        continue
-                    else:
-                        selections.append(sdict)
-        return selections
+        return self.extract()["selections"]
 
+    @log.traced
     def map_input_nodes(self, trace = None):
-        log.log_trace(self, "map_input_nodes", trace)
-        inf_trace = {"source": "function call",
-                     "parent": self.name + ".map_input_nodes"}
         """
         Updates the is_input property of each node object, using the simple
         node connection approximation.
         """
         self.input_nodes = []
         for n in self.nodes:
-            if (self.connections.previous_node(n.id, trace = inf_trace) == []
+            if (self.connections.previous_node(n.id) == []
                 and not n.is_decorator):
                 n.is_input = True
                 self.input_nodes.append(n)
             else:
                 n.is_input = False
 
+    @log.traced
     def map_output_nodes(self, trace = None):
-        log.log_trace(self, "map_output_nodes", trace)
-        inf_trace = {"source": "function call",
-                     "parent": self.name + ".map_output_nodes"}
         """
         Updates the is_output property of each node object, using the simple
         node connection approximation.
         """
         self.output_nodes = []
         for n in self.nodes:
-            if (self.connections.next_node(n.id, trace = inf_trace) == [] and
+            if (self.connections.next_node(n.id) == [] and
                 not n.is_decorator and not n.is_browse):
                 n.is_output = True
                 self.output_nodes.append(n)
             else:
                 n.is_output = False
 
+    @log.traced
     def map_defined_input_nodes(self, trace = None):
-        log.log_trace(self, "map_defined_input_nodes", trace)
         """
         Updates the is_defined_input property of each node object, using the
         defined list of input node types
@@ -283,8 +393,8 @@ class Workflow:
             pass
             # if n.type in
 
+    @log.traced
     def map_defined_output_nodes(self, trace = None):
-        log.log_trace(self, "map_defined_output_nodes", trace)
         """
         Updates the is_defined_output property of each node object, using the
         defined list of output node types
@@ -293,28 +403,60 @@ class Workflow:
             pass
             # if n.type in
 
-    def get_field_nodes(self, field, trace = None):
-        log.log_trace(self, "get_field_nodes", trace)
+    @log.traced
+    def map_multi_connection_nodes(self, trace = None):
         """
-        Gets nodes dealing with the given field
+        Updates the is_multi_connection property of each node object
         """
-        nodes = []
-        for f in self.formulas:
-            if field in f["field"]:
-                nodes.append(self.nodes.get_node(f["id"]))
-        return nodes
+        for n in self.nodes:
+            n.is_multi_connection = self.connections.is_node_multiconnection(n.id)
 
+    @log.traced
+    def get_field_nodes(self, field, trace = None, prefix = False):
+        """
+        Gets nodes reading or writing the given field. If prefix is True,
+        gets nodes dealing with any field starting with the given string.
+        """
+        return self.field_index.get_nodes(field, prefix = prefix)
+
+    @log.traced
+    def map_fields(self, trace = None):
+        """
+        Build the index of field names to the nodes that read or write them,
+        from the formulas, filters and selections of the workflow
+        """
+        from fields import FieldIndex
+        import mv_formulas as mvf
+        index = FieldIndex()
+        for f in self.formulas:
+            index.add(f["field"], f["node"])
+            if not f["expression"] is None:
+                index.add(mvf.fields_from_formula(f["expression"],
+                                                  mode = "Alteryx"),
+                          f["node"])
+        for f in self.filters:
+            #field is a list of fields for custom filters
+            index.add(f["field"], f["node"])
+        for s in self.selections:
+            index.add(s["field"], s["node"])
+            index.add(s["rename"], s["node"])
+        return index
+
+    @log.traced
     def copy(self, trace = None):
-        log.log_trace(self, "copy", trace)
+        from copy import deepcopy
         return deepcopy(self)
 
+    @log.traced
     def remove_node(self, node_id, trace = None):
-        log.log_trace(self, "previous_node", trace)
-        inf_trace = {"source": "function call",
-                      "parent": self.name + ".remove_node"}
         """
         Remove all connections associated with a certain node.
+
+        The analyses of the workflow are invalidated, the flags of the nodes
+        whose connections changed are recomputed, and the node is dropped
+        from the field index.
         """
+        self.node_flags
         n = self.nodes.get_node(node_id)
         if (n.is_input or n.is_output or n.is_multi_connection or
             n.is_defined_input or n.is_defined_output):
@@ -322,8 +464,9 @@ class Workflow:
                     + "overrides removal.")
         elif n.is_decorator:
             self.nodes.remove_node(node_id)
+            self.invalidate(node_ids = [node_id])
         else:
-            prev_nodes = self.connections.previous_node(node_id, inf_trace)
+            prev_nodes = self.connections.previous_node(node_id)
             if len(prev_nodes) > 1:
                 print("Warning: Node %s not removed. Multiple " % node_id
                         + "incoming connections.")
@@ -332,53 +475,109 @@ class Workflow:
                 self.connections.remove(c)
 
             prev_id = prev_nodes[0].id
+            affected = [prev_id]
             for c in self.connections.get_output_connections(node_id):
-                c.origin.id = prev_id
+                c = self.connections.set_origin(c, prev_id)
+                affected.append(c.destination.id)
 
             self.nodes.remove_node(node_id)
+            self.invalidate(node_ids = affected + [node_id])
 
-    def build_meta_workflow(self, field, trace = None):
-        log.log_trace(self, "build_meta_workflow", trace)
-        inf_trace = {"source": "function call",
-                     "parent": self.name + ".build_meta_workflow"}
+    @log.traced
+    def classify_meta_nodes(self, trace = None):
         """
-        Build a meta-workflow for a given field by taking the existing workflow
-        and removing all extraneous nodes and connections.
-
-        Will always keep all inputs and outputs, and any nodes with multiple
-        connections points
+        Classify the nodes of the workflow for building meta-workflows. The
+        classification does not depend on the field, so it is shared by all
+        the meta-workflows built from this workflow.
+
+        Returns a dictionary of
+            node_container: ToolID to the ToolID of its container, or None
+            fixed: ToolIDs of the input and output nodes, always kept
+            multi: ToolIDs of other nodes with multiple connections, always
+                kept
+            removable: ToolIDs of all other nodes, in workflow order
+            container_nodes: container ToolID to the ToolIDs of its nodes
+            container_dict_node: container ToolID to the number of nodes
+                always kept in it
         """
-        meta_workflow = self.copy(inf_trace)
-
-        field_nodes = meta_workflow.get_field_nodes(field, inf_trace)
-        field_nodes_id = [n.id for n in field_nodes]
-
-        #counts of types of nodes for each container
-        container_dict_field = {c.id: 0 for c in meta_workflow.containers}
-        container_dict_node = {c.id: 0 for c in meta_workflow.containers}
-
-        container_dict_field[None] = 0
+        node_container = {}
+        self.node_flags
+        fixed = set()
+        multi = set()
+        removable = []
+        container_dict_node = {c.id: 0 for c in self.containers}
         container_dict_node[None] = 0
 
-        for n in meta_workflow.nodes.nodes[:]:
+        for n in self.nodes:
             cid = n.container.id if not n.container is None else None
-
+            node_container[n.id] = cid
             if n.is_output or n.is_input:
+                fixed.add(n.id)
                 container_dict_node[cid] += 1
-
-            elif n.id in field_nodes_id:
-                container_dict_node[cid] += 1
-                container_dict_field[cid] += 1
-
             elif n.is_multi_connection:
+                multi.add(n.id)
                 container_dict_node[cid] += 1
+            else:
+                removable.append(n.id)
+
+        return {"node_container": node_container,
+                "fixed": fixed,
+                "multi": multi,
+                "removable": removable,
+                "container_nodes": {c.id: c.nodes.attr("id")
+                                    for c in self.containers},
+                "container_dict_node": container_dict_node}
+
+    @log.traced
+    def build_meta_workflow(self, field, trace = None, classification = None):
+        """
+        Build a meta-workflow for a given field by taking the existing workflow
+        and removing all extraneous nodes and connections.
 
-            elif field in n.fields:
+        Will always keep all inputs and outputs, and any nodes with multiple
+        connections points
+
+        Returns a MetaWorkflow view, which shares its nodes, connections and
+        containers with this workflow except where they have been changed.
+        A classification from classify_meta_nodes can be passed in to avoid
+        recomputing it for each field.
+
+        The time spent in each phase is added to self.stats.
+        """
+        stats = self.stats
+        #compute the lazy analyses first, in their own phases, so they are
+        #not also counted in the laps below
+        self.node_flags
+        self.field_index
+        stats.start()
+        if classification is None:
+            classification = self.classify_meta_nodes()
+            stats.lap("meta.classify")
+        node_container = classification["node_container"]
+        fixed = classification["fixed"]
+
+        meta_workflow = MetaWorkflow(self, field)
+        stats.lap("meta.view")
+
+        field_nodes_id = self.field_index.get_node_ids(field)
+
+        #counts of types of nodes for each container
+        container_dict_field = {cid: 0 for cid in
+                                classification["container_dict_node"]}
+        container_dict_node = dict(classification["container_dict_node"])
+
+        for nid in field_nodes_id:
+            if not nid in node_container or nid in fixed:
+                continue
+            cid = node_container[nid]
+            container_dict_field[cid] += 1
+            if not nid in classification["multi"]:
                 container_dict_node[cid] += 1
-                container_dict_field[cid] += 1
 
-            else:
-                meta_workflow.remove_node(n.id, inf_trace)
+        for nid in classification["removable"]:
+            if not nid in field_nodes_id:
+                meta_workflow.remove_node(nid)
+        stats.lap("meta.remove_nodes")
 
         """Collapse container down if there are no field nodes within it.
         If there are external connections, create an input/output
@@ -387,43 +586,117 @@ class Workflow:
         for cont in container_dict_field.keys():
             if cont is None: continue
             container = meta_workflow.containers.get_container(cont)
+            #List of nodes IDs within the container
+            con_nodes = classification["container_nodes"][cont]
 
             if container_dict_node[cont] == 0:
-                #List of nodes IDs within the container
-                con_nodes = container.nodes.attr("id")
                 """ Remove all connections to and from the nodes within the
                 container, then the container itself."""
                 meta_workflow.connections.remove_node_connections(con_nodes)
                 meta_workflow.nodes.remove_container(container,
                                                       remove_container = True,
-                                                      minimise_container = False,
-                                                      trace = inf_trace)
-                meta_workflow.containers.remove(cont, trace = inf_trace)
+                                                      minimise_container = False)
+                meta_workflow.containers.remove(cont)
+                meta_workflow.collapsed[cont] = "removed"
 
             elif container_dict_field[cont] == 0:
-                con_nodes = container.nodes.attr("id")
-
-                for c in meta_workflow.connections:
-                    if (c.destination.id in con_nodes and not c.origin.id
-                        in con_nodes):
-                        c.destination.id = cont
-                        c.destination.type = "ContainerInput"
-                    elif (not c.destination.id in con_nodes and c.origin.id
-                        in con_nodes):
-                        c.origin.id = cont
-                        c.origin.type = "ContainerOutput"
-                    else:
-                        continue
+                con_nodes_set = set(con_nodes)
+
+                """ Only the connections touching the container need to be
+                visited to rewire the external ones to the container """
+                for nid in con_nodes:
+                    for c in meta_workflow.connections.get_input_connections(nid):
+                        if not c.origin.id in con_nodes_set:
+                            meta_workflow.connections.set_destination(
+                                c, cont, "ContainerInput")
+                    for c in meta_workflow.connections.get_output_connections(nid):
+                        if not c.destination.id in con_nodes_set:
+                            meta_workflow.connections.set_origin(
+                                c, cont, "ContainerOutput")
                 meta_workflow.connections.remove_node_connections(con_nodes)
-                meta_workflow.nodes.remove_container(container,
-                                                      remove_container = False,
-                                                      minimise_container = True,
-                                                      trace = inf_trace)
+                meta_workflow.nodes.remove_container(
+                    container, containers = meta_workflow.containers)
+                meta_workflow.collapsed[cont] = "minimised"
             else:
                 pass
+        stats.lap("meta.collapse")
+        stats.count("meta_workflows")
 
         return meta_workflow
 
+    @log.traced
+    def build_meta_workflows(self, fields = None, trace = None):
+        """
+        Generator of meta-workflows for each of a list of fields, or every
+        field in the workflow if fields is None. The node classification is
+        computed once and shared, and each meta-workflow is only built when
+        the generator reaches it.
+        """
+        if fields is None:
+            fields = list(self.field_index)
+        with self.stats.phase("meta.classify"):
+            classification = self.classify_meta_nodes()
+        for field in fields:
+            yield self.build_meta_workflow(field,
+                                           classification = classification)
+
+
+class MetaWorkflow:
+    """
+    Copy-on-write view of a Workflow, used for meta-workflows.
+
+    The nodes, connections and containers have the same interfaces as those
+    of a Workflow, but share their Node, Connection and Container objects
+    with the base workflow. Only connections that are rewired and containers
+    that are minimised are copied, so the base workflow is never modified.
+    Any other attribute, e.g. formulas or field_index, is read from the base
+    workflow.
+    """
+    @log.traced
+    def __init__(self, workflow, field = None, trace = None):
+        self.base = workflow
+        self.field = field
+        self.name = workflow.name
+        self.nodes = workflow.nodes.copy()
+        self.connections = workflow.connections.copy()
+        self.containers = workflow.containers.copy()
+        #ids of containers that have been removed or minimised
+        self.collapsed = {}
+
+    def __getattr__(self, attr):
+        #only called for attributes not set on the view itself
+        if attr == "base":
+            raise AttributeError(attr)
+        return getattr(self.base, attr)
+
+    @property
+    def node_ids(self):
+        """
+        Set of the ToolIDs of the nodes retained in the view
+        """
+        return {n.id for n in self.nodes}
+
+    @property
+    def rewired(self):
+        """
+        List of the connections rewired in the view
+        """
+        return self.connections.rewired
+
+    remove_node = Workflow.remove_node
+
+    def invalidate(self, node_ids = None, trace = None):
+        """
+        The analyses of a view are those of its base workflow, and the flags
+        of the nodes it shares with the base workflow are not changed
+        """
+        pass
+
+    @log.traced
+    def copy(self, trace = None):
+        from copy import deepcopy
+        return deepcopy(self)
+
 
 if __name__ == "__main__":
     workflow = Workflow("..\\Workflows\\ar-sc.txt",
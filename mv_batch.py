@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 11:02:17 2026
+
+@author: marcu
+"""
+
+from mh_logging import log
+from mountain_view_alteryx import Workflow
+from mv_cache import ParseCache
+from mv_stats import Stats
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+import glob
+import os
+import sys
+import traceback
+
+class BatchResult:
+    """
+    The outcome of loading a single workflow in a batch. Exactly one of
+    workflow and error is None.
+    """
+    __slots__ = ("filepath", "workflow", "error")
+    def __init__(self, filepath, workflow = None, error = None):
+        self.filepath = filepath
+        self.workflow = workflow
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+#parse cache of the worker process, created once by _init_worker so that
+#the shared formula cache is only loaded once per worker
+_worker_cache = None
+
+def _init_worker(cache_dir):
+    """
+    Initialise a worker process, or the current process when loading
+    without workers
+    """
+    global _worker_cache
+    _worker_cache = (None if cache_dir is None
+                     else ParseCache(cache_dir, share_formulas = True))
+
+def _load_chunk(filepaths, options):
+    """
+    Load a list of workflows in a worker process. Errors are caught per
+    file so that one bad workflow does not lose the rest of the chunk.
+    """
+    options = dict(options)
+    cache_dir = options.pop("cache_dir", None)
+    if (not cache_dir is None and 
+        (_worker_cache is None or _worker_cache.directory != cache_dir)):
+        _init_worker(cache_dir)
+    cache = None if cache_dir is None else _worker_cache
+    results = []
+    for filepath in filepaths:
+        try:
+            workflow = Workflow(filepath, cache = cache, **options)
+            results.append(BatchResult(filepath, workflow = workflow))
+        except Exception:
+            results.append(BatchResult(filepath,
+                                       error = traceback.format_exc()))
+    if not cache is None:
+        cache.save_formulas()
+    #pool workers exit without running atexit, so trace records would be
+    #lost if not written out here
+    log.flush()
+    return results
+
+class BatchLoader:
+    """
+    Load a repository of workflows across a pool of worker processes.
+
+    Workflows are parsed in slim mode without their raw XML by default, so
+    the results sent back from the workers are cheap to pickle. The load
+    stats of every workflow are aggregated in self.stats.
+    """
+    extensions = (".yxmd", ".yxmc", ".yxwz")
+    @log.traced
+    def __init__(self, workers = None, chunksize = 8, cache_dir = None,
+                 streaming = False, keep_raw_xml = False, slim = True,
+                 trace = None):
+        self.workers = os.cpu_count() if workers is None else workers
+        self.chunksize = chunksize
+        self.options = {"streaming": streaming,
+                        "keep_raw_xml": keep_raw_xml,
+                        "slim": slim,
+                        "cache_dir": cache_dir}
+        self.errors = []
+        self.stats = Stats()
+
+    @log.traced
+    def find_workflows(self, source, trace = None):
+        """
+        Return a sorted list of workflow file paths from a directory, which
+        is searched recursively, or from a glob pattern
+        """
+        if os.path.isdir(source):
+            filepaths = []
+            for root, dirs, files in os.walk(source):
+                filepaths += [os.path.join(root, f) for f in files
+                              if f.lower().endswith(self.extensions)]
+        else:
+            filepaths = glob.glob(source, recursive = True)
+        return sorted(filepaths)
+
+    @log.traced
+    def load(self, source, trace = None):
+        """
+        Generator of BatchResult objects for each workflow in the given
+        directory, glob pattern or list of file paths. Results are yielded
+        as each chunk completes, so they are not in input order. Failed
+        workflows are also collected in self.errors.
+        """
+        if type(source) == str:
+            filepaths = self.find_workflows(source)
+        else:
+            filepaths = list(source)
+        chunks = [filepaths[i:i + self.chunksize]
+                  for i in range(0, len(filepaths), self.chunksize)]
+
+        cache_dir = self.options["cache_dir"]
+        if self.workers <= 1:
+            _init_worker(cache_dir)
+            for chunk in chunks:
+                yield from self._collect(_load_chunk(chunk, self.options))
+            return
+
+        with ProcessPoolExecutor(max_workers = self.workers,
+                                 initializer = _init_worker,
+                                 initargs = (cache_dir,)) as executor:
+            futures = [executor.submit(_load_chunk, chunk, self.options)
+                       for chunk in chunks]
+            for future in as_completed(futures):
+                yield from self._collect(future.result())
+
+    def _collect(self, results):
+        for result in results:
+            if not result.ok:
+                self.errors.append((result.filepath, result.error))
+            else:
+                self.stats.merge(result.workflow.stats)
+            yield result
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(
+        description = "Parse a directory or glob of Alteryx workflows in "
+                      "parallel")
+    parser.add_argument("source", help = "directory or glob pattern")
+    parser.add_argument("-w", "--workers", type = int, default = None,
+                        help = "number of worker processes")
+    parser.add_argument("-c", "--chunksize", type = int, default = 8,
+                        help = "workflows sent to a worker at a time")
+    parser.add_argument("--cache", default = None,
+                        help = "parse cache directory")
+    parser.add_argument("--streaming", action = "store_true",
+                        help = "parse each workflow with iterparse")
+    parser.add_argument("--stats", default = None, metavar = "FILE",
+                        help = "write the aggregated load stats as JSON")
+    args = parser.parse_args(argv)
+
+    loader = BatchLoader(workers = args.workers, chunksize = args.chunksize,
+                         cache_dir = args.cache, streaming = args.streaming)
+    count = 0
+    for result in loader.load(args.source):
+        count += 1
+        if result.ok:
+            w = result.workflow
+            print("%s\t%s nodes\t%s connections\t%s containers" %
+                  (result.filepath, w.nodes.count, w.connections.count,
+                   w.containers.count))
+        else:
+            print("%s\tERROR" % result.filepath)
+
+    for filepath, error in loader.errors:
+        print("\n%s\n%s" % (filepath, error), file = sys.stderr)
+    print("%s workflows, %s errors" % (count, len(loader.errors)),
+          file = sys.stderr)
+    if not args.stats is None:
+        loader.stats.dump(args.stats)
+    return 1 if loader.errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
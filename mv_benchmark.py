@@ -0,0 +1,417 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 14:02:55 2026
+
+@author: marcu
+"""
+
+from mountain_view_alteryx import Workflow
+from mv_synthetic import SyntheticWorkflow
+import mv_formulas as mvf
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+default_sizes = [100, 1000, 10000, 50000]
+
+#largest canvas, in pixels, the in-memory raster benchmark is run for. At 3
+#bytes per pixel this is 192 MiB. The canvas of a synthetic workflow grows
+#with its number of tools, and is around 1 GiB at 10000 tools
+default_max_pixels = 64*1024**2
+
+#incremented whenever a benchmark changes what it measures, so that reports
+#from before and after the change are not compared as like for like.
+#2: the analyses of a workflow became lazy, so load and load_streaming
+#now read them explicitly, doing the same work as before, and load_lazy
+#measures construction alone
+benchmark_version = 2
+
+def load_analysed(filepath, **kwargs):
+    """
+    Load a workflow and compute all of its analyses, which are otherwise
+    computed on first use
+    """
+    workflow = Workflow(filepath, **kwargs)
+    workflow.formulas
+    workflow.field_index
+    workflow.node_flags
+    return workflow
+
+def git_commit():
+    """
+    Return the commit hash of the working tree, with a "+dirty" suffix if
+    it has uncommitted changes, or None if it is not a git repository
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"],
+                                cwd = directory, capture_output = True,
+                                text = True, check = True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain",
+                                "--untracked-files=no"],
+                               cwd = directory, capture_output = True,
+                               text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("+dirty" if dirty else "")
+
+def rss():
+    """
+    Return the resident set size of this process in bytes, or None if it
+    cannot be read on this platform
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1])*os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+class RSSSampler:
+    """
+    Samples the resident set size of the process from a background thread
+    while in a with statement, recording the peak increase over the size
+    at the start in peak. Unlike tracemalloc, this includes memory
+    allocated by C extensions, e.g. PIL images.
+    
+    Where the resident set size cannot be sampled, the increase in the
+    peak resident set size of the process is used instead, which is zero
+    if the process has used more memory at some earlier point.
+    """
+    def __init__(self, interval = 0.001):
+        self.interval = interval
+        self.peak = None
+    
+    def _maxrss(self):
+        try:
+            import resource
+        except ImportError:
+            return None
+        #kilobytes on Linux, bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*scale
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._max = max(self._max, rss())
+    
+    def __enter__(self):
+        self._start = rss()
+        self._thread = None
+        if self._start is None:
+            self._start = self._maxrss()
+            return self
+        self._max = self._start
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target = self._run, daemon = True)
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        if self._thread is None:
+            end = self._maxrss()
+            self.peak = (None if self._start is None or end is None 
+                         else end - self._start)
+        else:
+            self._stop.set()
+            self._thread.join()
+            self.peak = max(self._max, rss()) - self._start
+        return False
+
+def measure(function, setup = None, repeat = 5, memory = "python"):
+    """
+    Time function over repeat runs, then run it once more to find its peak
+    memory use. If setup is given, it is called before each run, untimed, 
+    and its result is passed to function.
+    
+    With memory = "python", memory is measured with tracemalloc, which
+    only sees memory allocated by Python. With memory = "rss" it is the
+    peak increase in the resident set size of the process, which includes
+    buffers allocated by C extensions, but also anything else the process
+    allocates at the same time.
+
+    Returns a dict of the min and median time in seconds, and the peak
+    memory in bytes.
+    """
+    times = []
+    for i in range(repeat):
+        arg = None if setup is None else setup()
+        gc.collect()
+        start = time.perf_counter()
+        if setup is None:
+            function()
+        else:
+            function(arg)
+        times.append(time.perf_counter() - start)
+
+    arg = None if setup is None else setup()
+    gc.collect()
+    if memory == "rss":
+        with RSSSampler() as sampler:
+            if setup is None:
+                function()
+            else:
+                function(arg)
+        peak = sampler.peak
+    else:
+        tracemalloc.start()
+        try:
+            if setup is None:
+                function()
+            else:
+                function(arg)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    times.sort()
+    return {"min": times[0],
+            "median": times[len(times)//2],
+            "peak_memory": peak,
+            "memory": memory,
+            "repeat": repeat}
+
+class Benchmark:
+    """
+    Times and memory-profiles the main operations on synthetic workflows of
+    each of a list of sizes. Workflows are generated with a fixed seed, so
+    results from different commits are comparable.
+    """
+    benchmarks = ["load", "load_streaming", "load_lazy", "map_input_nodes",
+                  "map_output_nodes", "build_meta_workflow",
+                  "fields_from_formula", "flow_diagram", "flow_diagram_svg",
+                  "flow_diagram_tiles"]
+    def __init__(self, sizes = None, repeat = 5, seed = 0, benchmarks = None,
+                 directory = None, max_pixels = default_max_pixels):
+        self.sizes = default_sizes if sizes is None else sizes
+        self.max_pixels = max_pixels
+        self.repeat = repeat
+        self.seed = seed
+        self.selected = self.benchmarks if benchmarks is None else benchmarks
+        self.directory = directory
+        self.results = []
+
+    def _generator(self, size):
+        return SyntheticWorkflow(nodes = size, seed = self.seed)
+
+    def _record(self, size, name, result):
+        result = dict(result, size = size, benchmark = name)
+        self.results.append(result)
+        print("%8d %-22s %s" % (
+            size, name,
+            result["skipped"] if "skipped" in result else
+            "%10.3f ms %10s KiB %s" % (
+                result["min"]*1000,
+                "?" if result["peak_memory"] is None else
+                "%.1f" % (result["peak_memory"]/1024), result["memory"])),
+              file = sys.stderr)
+
+    def _pil_unavailable(self):
+        """
+        Return why PIL cannot be used for the raster rendering benchmarks,
+        or None if it can
+        """
+        try:
+            from flow_diagram import pil
+            pil()
+        except (ImportError, OSError) as e:
+            return "%s: %s" % (e.__class__.__name__, e)
+        return None
+
+    def _canvas_too_large(self, workflow):
+        """
+        Return why the raster canvas of a workflow is too large to render
+        in memory, or None if it is not
+        """
+        from flow_diagram import FlowDiagram, Layout
+        d = FlowDiagram
+        width, height = Layout(workflow, scale = d.scale, border = d.border,
+                               node_width = d.node_width,
+                               node_height = d.node_height,
+                               container_padding = d.container_padding).size
+        if width*height <= self.max_pixels:
+            return None
+        return "canvas of %dx%d pixels is over max_pixels %d" % (
+            width, height, self.max_pixels)
+
+    def run_size(self, size, directory):
+        filepath = self._generator(size).write(
+            os.path.join(directory, "synthetic_%d.yxmd" % size))
+        selected = self.selected
+        repeat = self.repeat
+
+        if "load" in selected:
+            self._record(size, "load",
+                         measure(lambda: load_analysed(filepath),
+                                 repeat = repeat))
+        if "load_streaming" in selected:
+            self._record(size, "load_streaming",
+                         measure(lambda: load_analysed(filepath,
+                                                       streaming = True,
+                                                       keep_raw_xml = False,
+                                                       slim = True),
+                                 repeat = repeat))
+        if "load_lazy" in selected:
+            self._record(size, "load_lazy",
+                         measure(lambda: Workflow(filepath), repeat = repeat))
+
+        workflow = Workflow(filepath)
+        if "map_input_nodes" in selected:
+            self._record(size, "map_input_nodes",
+                         measure(workflow.map_input_nodes, repeat = repeat))
+        if "map_output_nodes" in selected:
+            self._record(size, "map_output_nodes",
+                         measure(workflow.map_output_nodes, repeat = repeat))
+
+        #the most used field gives the largest meta-workflow
+        fields = sorted(workflow.field_index,
+                        key = lambda f: (-len(workflow.field_index.fields_dict[f]),
+                                         f))
+        field = fields[0] if fields else None
+        if "build_meta_workflow" in selected and not field is None:
+            self._record(size, "build_meta_workflow",
+                         measure(lambda: workflow.build_meta_workflow(field),
+                                 repeat = repeat))
+
+        if "fields_from_formula" in selected:
+            expressions = [f["expression"] for f in workflow.formulas
+                           if not f["expression"] is None]
+            def analyse(arg = None):
+                for e in expressions:
+                    mvf.fields_from_formula(e, mode = "Alteryx")
+            #without the formula cache, as if every formula were new
+            self._record(size, "fields_from_formula",
+                         measure(analyse, setup = mvf.formula_cache.clear,
+                                 repeat = repeat))
+
+        if field is None:
+            return
+        meta_workflow = workflow.build_meta_workflow(field)
+        #the rendering benchmarks measure the resident set size, as most of
+        #their memory is allocated by PIL rather than Python
+        unavailable = self._pil_unavailable()
+        if "flow_diagram" in selected:
+            skipped = (unavailable if not unavailable is None else
+                       self._canvas_too_large(meta_workflow))
+            if not skipped is None:
+                self._record(size, "flow_diagram", {"skipped": skipped})
+            else:
+                from flow_diagram import FlowDiagram
+                self._record(size, "flow_diagram",
+                             measure(lambda: FlowDiagram(meta_workflow),
+                                     repeat = repeat, memory = "rss"))
+        if "flow_diagram_svg" in selected:
+            from flow_diagram import FlowDiagram, SVGBackend
+            svg_filepath = os.path.join(directory, "synthetic_%d.svg" % size)
+            self._record(size, "flow_diagram_svg",
+                         measure(lambda: FlowDiagram(
+                             meta_workflow,
+                             backend = SVGBackend(svg_filepath)),
+                                 repeat = repeat, memory = "rss"))
+        if "flow_diagram_tiles" in selected and not unavailable is None:
+            self._record(size, "flow_diagram_tiles",
+                         {"skipped": unavailable})
+        elif "flow_diagram_tiles" in selected:
+            from flow_diagram import FlowDiagram, TiledBackend
+            tile_directory = os.path.join(directory, "tiles_%d" % size)
+            self._record(size, "flow_diagram_tiles",
+                         measure(lambda: FlowDiagram(
+                             meta_workflow,
+                             backend = TiledBackend(tile_directory,
+                                                    levels = None)),
+                                 repeat = repeat, memory = "rss"))
+
+    def run(self):
+        """
+        Run the benchmarks for every size and return the results as a
+        dictionary
+        """
+        self.results = []
+        if self.directory is None:
+            with tempfile.TemporaryDirectory() as directory:
+                for size in self.sizes:
+                    self.run_size(size, directory)
+        else:
+            os.makedirs(self.directory, exist_ok = True)
+            for size in self.sizes:
+                self.run_size(size, self.directory)
+        return self.report()
+
+    def report(self):
+        return {"commit": git_commit(),
+                "python": sys.version,
+                "implementation": platform.python_implementation(),
+                "platform": platform.platform(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "benchmark_version": benchmark_version,
+                "seed": self.seed,
+                "repeat": self.repeat,
+                "results": self.results}
+
+def compare(old, new):
+    """
+    Return lines comparing the min times of two benchmark reports
+    """
+    old_results = {(r["size"], r["benchmark"]): r for r in old["results"]}
+    lines = []
+    old_version = old.get("benchmark_version", 1)
+    if old_version != new.get("benchmark_version", 1):
+        lines.append("warning: benchmark version %s compared with %s, some "
+                     "benchmarks measure different work" % (
+                         old_version, new.get("benchmark_version", 1)))
+    lines += ["%8s %-22s %12s %12s %8s" % ("size", "benchmark", "old ms",
+                                          "new ms", "ratio")]
+    for r in new["results"]:
+        o = old_results.get((r["size"], r["benchmark"]), None)
+        if o is None or "skipped" in r or "skipped" in o:
+            continue
+        lines.append("%8d %-22s %12.3f %12.3f %8.2f" % (
+            r["size"], r["benchmark"], o["min"]*1000, r["min"]*1000,
+            r["min"]/o["min"] if o["min"] else float("nan")))
+    return lines
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(
+        description = "Benchmark workflow loading and analysis on synthetic "
+                      "workflows")
+    parser.add_argument("-s", "--sizes", type = int, nargs = "+",
+                        default = default_sizes,
+                        help = "number of tools in each workflow")
+    parser.add_argument("-r", "--repeat", type = int, default = 5)
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--max-pixels", type = int,
+                        default = default_max_pixels,
+                        help = "largest canvas of the raster flow_diagram "
+                               "benchmark")
+    parser.add_argument("-b", "--benchmarks", nargs = "+", default = None,
+                        choices = Benchmark.benchmarks)
+    parser.add_argument("-o", "--output", default = None,
+                        help = "JSON file to write the results to")
+    parser.add_argument("--compare", default = None, metavar = "FILE",
+                        help = "earlier results to compare against")
+    args = parser.parse_args(argv)
+
+    report = Benchmark(sizes = args.sizes, repeat = args.repeat,
+                       seed = args.seed, benchmarks = args.benchmarks,
+                       max_pixels = args.max_pixels).run()
+    if args.output is None:
+        print(json.dumps(report, indent = 2))
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent = 2)
+
+    if not args.compare is None:
+        with open(args.compare) as f:
+            old = json.load(f)
+        print("\n".join(compare(old, report)), file = sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 10:12:40 2026
+
+@author: marcu
+"""
+
+from mh_logging import log
+import mv_formulas as mvf
+import hashlib
+import os
+import pickle
+import tempfile
+
+#increment whenever the pickled workflow model changes shape, so that stale
+#entries are ignored rather than loaded
+CACHE_FORMAT = 4
+
+#modules defining the classes pickled in a cached model
+model_modules = ["mountain_view_alteryx", "nodes", "connections",
+                 "containers", "spatial"]
+
+_model_version = None
+
+def model_version():
+    """
+    Return the version stored with and checked against each cache entry.
+    This is CACHE_FORMAT plus a hash of the source of the model modules,
+    so that entries pickled from any other version of the model classes are
+    ignored even if CACHE_FORMAT was not incremented. Only the parsed model
+    is cached, so the extractors and formula tokenizer are not included.
+    """
+    global _model_version
+    if _model_version is None:
+        digest = hashlib.sha1()
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for module in model_modules:
+            try:
+                with open(os.path.join(directory, module + ".py"), 'rb') as f:
+                    digest.update(f.read())
+            except OSError:
+                digest.update(module.encode())
+        _model_version = "%d-%s" % (CACHE_FORMAT, digest.hexdigest())
+    return _model_version
+
+class ParseCache:
+    """
+    On-disk cache of parsed Workflow models, i.e. their nodes, connections
+    and containers, stored as pickles in a single directory.
+
+    Entries are keyed by a hash of the file contents. A small key file per
+    workflow path records its (mtime, size, hash) so that files which have
+    not changed since they were last seen are not re-hashed. When the total
+    size of the entries exceeds max_size bytes, the least recently used
+    entries are removed.
+
+    If share_formulas is True, the formula analysis cache in mv_formulas is
+    loaded from the cache directory, and can be written back to it with
+    save_formulas.
+    """
+    entry_ext = ".pickle"
+    key_ext = ".key"
+    formulas_name = "formulas.lru"
+    @log.traced
+    def __init__(self, directory, max_size = 512*1024**2,
+                 share_formulas = False, trace = None):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        #running total of the entry sizes, so the directory is only scanned
+        #when the limit may have been exceeded
+        self.size = None
+        os.makedirs(directory, exist_ok = True)
+        self.formulas_path = os.path.join(directory, self.formulas_name)
+        if share_formulas:
+            mvf.formula_cache.load(self.formulas_path)
+
+    def _read(self, filepath):
+        """
+        Unpickle a file, returning None if it is missing or unreadable
+        """
+        try:
+            with open(filepath, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError,
+                AttributeError, ImportError):
+            return None
+
+    def _write(self, filepath, obj):
+        """
+        Atomically pickle an object to a file, so readers in other processes
+        never see a partially written entry
+        """
+        fd, tmp = tempfile.mkstemp(dir = self.directory, suffix = ".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(obj, f, protocol = pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, filepath)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    @log.traced
+    def file_hash(self, filepath, trace = None):
+        """
+        Return the content hash of a file, only reading the file if its
+        modification time or size have changed since it was last hashed
+        """
+        stat = os.stat(filepath)
+        key = hashlib.sha1(os.path.abspath(filepath).encode()).hexdigest()
+        key_path = os.path.join(self.directory, key + self.key_ext)
+        known = self._read(key_path)
+        if (not known is None and known[0] == stat.st_mtime_ns
+            and known[1] == stat.st_size):
+            return known[2]
+
+        digest = hashlib.sha1()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024*1024), b""):
+                digest.update(chunk)
+        digest = digest.hexdigest()
+
+        self._write(key_path, (stat.st_mtime_ns, stat.st_size, digest))
+        return digest
+
+    def entry_path(self, digest):
+        return os.path.join(self.directory, digest + self.entry_ext)
+
+    @log.traced
+    def get(self, filepath, trace = None):
+        """
+        Return the cached model for a given file, or None if there is no
+        valid entry for its current contents
+        """
+        entry_path = self.entry_path(self.file_hash(filepath))
+        entry = self._read(entry_path)
+        if entry is None or entry.get("format", None) != model_version():
+            self.misses += 1
+            return None
+
+        #mark the entry as recently used for eviction
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        self.hits += 1
+        return entry["model"]
+
+    @log.traced
+    def put(self, filepath, model, trace = None):
+        """
+        Store the model for a given file, then evict old entries if the
+        cache has grown beyond max_size
+        """
+        entry_path = self.entry_path(self.file_hash(filepath))
+        self._write(entry_path, {"format": model_version(), "model": model})
+        if not self.size is None:
+            self.size += os.path.getsize(entry_path)
+        if self.size is None or self.size > self.max_size:
+            self.evict()
+
+    @log.traced
+    def evict(self, trace = None):
+        """
+        Remove the least recently used entries until the total size of the
+        cache is within max_size
+        """
+        entries = []
+        total = 0
+        for e in os.scandir(self.directory):
+            if not e.name.endswith(self.entry_ext):
+                continue
+            try:
+                stat = e.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, e.path))
+            total += stat.st_size
+
+        entries.sort()
+        for mtime, size, entry_path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(entry_path)
+            except OSError:
+                continue
+            total -= size
+        self.size = total
+
+    @log.traced
+    def save_formulas(self, trace = None):
+        """
+        Save the formula analysis cache next to the parsed workflows, if
+        it has any new results. Results saved by other processes are kept.
+        """
+        if mvf.formula_cache.unsaved:
+            mvf.formula_cache.save(self.formulas_path)
+
+    @log.traced
+    def clear(self, trace = None):
+        """
+        Remove every entry and key file
+        """
+        for e in os.scandir(self.directory):
+            if (e.name.endswith((self.entry_ext, self.key_ext)) or
+                e.name == self.formulas_name):
+                os.remove(e.path)
+        self.size = 0
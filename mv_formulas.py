@@ -6,77 +6,246 @@ Created on Fri Jul 30 23:45:24 2021
 """
 
 import re
+import os
+import hashlib
+from collections import OrderedDict
 from mh_logging import log
 
 
-def fields_from_formula(formula, mode, trace = None):
-    log.log_trace(__name__, "fields_from_formula", trace)
+#characters used to denote string limits, and the start and end characters
+#used to denote field names, for each formula mode
+formula_chars = {"Alteryx": {"quote_chars": ['"', "'"],
+                             "field_char_map": {"[": "]"}},
+                 "SQL": {"quote_chars": ["'"],
+                         "field_char_map": {"[": "]", '"': '"'}}
+                 }
+
+def _tokenizer(mode):
     """
-    Given a formula, tries to extract a list of all formulas used in
-    it. Default character sets deal with Alteryx formulas
+    Build the compiled tokenizer regex for a formula mode. Each alternative
+    consumes one complete string literal or field name, so a single left to
+    right scan of the formula visits every character once. Only field names
+    are captured, one group per kind of field name. An unterminated string
+    runs to the end of the formula, and an unterminated field name is
+    ignored along with the rest of the formula.
+    """
+    chars = formula_chars[mode]
+    tokens = []
+    for start, end in chars["field_char_map"].items():
+        tokens.append("%s(?:([^%s]*)%s|.*\\Z)" % (re.escape(start), 
+                                                  re.escape(end), 
+                                                  re.escape(end)))
+    for q in chars["quote_chars"]:
+        if q in chars["field_char_map"]: continue
+        tokens.append("%s[^%s]*(?:%s|\\Z)" % (re.escape(q), re.escape(q), 
+                                              re.escape(q)))
+    return re.compile("|".join(tokens), re.DOTALL)
+
+_tokenizers = {mode: _tokenizer(mode) for mode in formula_chars}
+
+def _tokenizer_patterns():
+    """
+    Return the pattern of the tokenizer of each mode, saved with the formula
+    cache so that results found by other tokenizers are not loaded
+    """
+    return {mode: t.pattern for mode, t in _tokenizers.items()}
+
+class FormulaCache:
+    """
+    Bounded least recently used cache of formula analysis results, keyed on
+    (formula hash, mode). Counts hits and misses, and can be saved to and
+    loaded from disk so results are shared between runs.
     
-    Works through the formula, looking for character signifying either the
-    beginning of a string (quote_chars) or the beginning of a field name
-    (field_chars). Once found, it will match all the way to the end of that
-    string or field name, remove it from the formula, and add it to the
-    list of fields if it is a field name.
+    Formulas are keyed by a hash of their text, so long formulas are not
+    held in memory, and the cache is limited both to max_size entries and
+    to roughly max_bytes of keys and results.
     """
+    #version of the file written by save
+    file_version = 2
+    #approximate bytes used by an entry, besides the text of its fields
+    entry_overhead = 200
+    def __init__(self, max_size = 65536, max_bytes = 32*1024**2):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.results = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        #number of results added since the cache was last saved or loaded
+        self.unsaved = 0
     
-    fields = []
-    if mode == "Alteryx":
-        quote_chars = ['"', "'"] #chars used to denote string limits
-        field_chars = ["["] #chars used to denote field name limits
-        field_char_map = {"[": "]"} #ending char for a field start char
-    elif mode == "SQL":
-        quote_chars = ["'"]
-        field_chars = ["[", '"']
-        field_char_map = {"[": "]", '"': '"'}
-    else:
-        raise ValueError("Invalid formula character set entered. "
-                         "Enter one of Alteryx/SQL")
-        
-    def get_index(string, char, start=0):
+    def __len__(self):
+        return len(self.results)
+    
+    @staticmethod
+    def key(formula, mode):
+        """
+        Return the cache key of a formula in a given mode
+        """
+        return (hashlib.blake2b(formula.encode("utf-8"), 
+                                digest_size = 16).digest(), mode)
+    
+    def _size(self, result):
+        return self.entry_overhead + sum(len(f) for f in result)
+    
+    def get(self, key):
+        """
+        Return the cached result for a given key, or None if not cached
+        """
         try:
-            return string.index(char, start)
-        except ValueError:
+            result = self.results[key]
+        except KeyError:
+            self.misses += 1
             return None
-        
-    def first_char(string, chars):
-        out = (None, "")
-        for c in chars:
-            i = get_index(string, c)
-            if i is None: 
-                continue
-            else:
-                if out[0] is None or i < out[0]:
-                    out = (i, c)
-        return out
-    
-    # while not re.search(".*(\[[^\[\]]+?\]).*", formula) is None:
-    def has_field(formula):
-        regex_special_chars = "[](){}*+?|^$.\\"
-        for c in field_chars:
-            ce = field_char_map[c]
-            if c in regex_special_chars: c = "\\" + c
-            if ce in regex_special_chars: ce = "\\" + ce
-            regex = ".*(%s[^%s%s]+?%s).*" % (c, c, ce, ce)
-            if not re.search(regex, formula) is None:
-                return True
+        self.results.move_to_end(key)
+        self.hits += 1
+        return result
+    
+    def _add(self, key, result, last = True):
+        old = self.results.get(key, None)
+        if not old is None:
+            self.bytes -= self._size(old)
+        self.results[key] = result
+        self.results.move_to_end(key, last = last)
+        self.bytes += self._size(result)
+    
+    def _evict(self):
+        while (len(self.results) > self.max_size or 
+               (self.bytes > self.max_bytes and self.results)):
+            key, result = self.results.popitem(last = False)
+            self.bytes -= self._size(result)
+    
+    def put(self, key, result):
+        self._add(key, result)
+        self.unsaved += 1
+        self._evict()
+    
+    def clear(self):
+        self.results.clear()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.unsaved = 0
+    
+    def _read(self, filepath):
+        """
+        Return the results saved in a file, or an empty dict if there are 
+        none or they were saved by another version or with other tokenizers
+        """
+        import pickle
+        try:
+            with open(filepath, 'rb') as f:
+                saved = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return {}
+        if (type(saved) != dict or 
+            saved.get("version", None) != self.file_version or
+            saved.get("tokenizers", None) != _tokenizer_patterns()):
+            return {}
+        return saved["results"]
+    
+    def save(self, filepath):
+        """
+        Pickle the cached results to a file, merged with the results already
+        saved in it by other processes, which are kept as the least recently
+        used. The file is locked while it is merged where the platform
+        supports it, and replaced atomically so concurrent readers never see
+        a partial write.
+        """
+        import pickle
+        with _FileLock(filepath + ".lock"):
+            merged = FormulaCache(max_size = self.max_size,
+                                  max_bytes = self.max_bytes)
+            for key, result in self._read(filepath).items():
+                merged._add(key, result)
+            for key, result in self.results.items():
+                merged._add(key, result)
+            merged._evict()
+            
+            tmp = "%s.%s.tmp" % (filepath, os.getpid())
+            with open(tmp, 'wb') as f:
+                pickle.dump({"version": self.file_version,
+                             "tokenizers": _tokenizer_patterns(),
+                             "results": dict(merged.results)}, f, 
+                            protocol = pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, filepath)
+        self.unsaved = 0
+    
+    def load(self, filepath):
+        """
+        Add results saved with save to the cache, if the file exists. 
+        Results already in the cache are kept as the most recently used.
+        """
+        for key, result in self._read(filepath).items():
+            if not key in self.results:
+                self._add(key, result, last = False)
+        self._evict()
+
+class _FileLock:
+    """
+    Exclusive advisory lock on a file, held in a with statement. Does
+    nothing on platforms without fcntl.
+    """
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._file = None
+    
+    def __enter__(self):
+        try:
+            import fcntl
+        except ImportError:
+            return self
+        self._file = open(self.filepath, "a")
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+    
+    def __exit__(self, *exc):
+        if not self._file is None:
+            import fcntl
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
         return False
 
-    while has_field(formula):
-        #remove strings from the formula
-        str_start, char = first_char(formula, field_chars + quote_chars)
-        
-        #Get the corresponding end character of the field name
-        if char in field_chars:
-            str_end = get_index(formula, field_char_map[char], str_start + 1)
-            fields.append(formula[str_start+1:str_end])
-        else:
-            str_end = get_index(formula, char, str_start + 1)
-        
-        formula = formula[:str_start] + formula[str_end + 1:]
-    return list(set(fields))
+#process-wide cache used by fields_from_formula
+formula_cache = FormulaCache()
+
+@log.traced
+def fields_from_formula(formula, mode, trace = None):
+    """
+    Given a formula, tries to extract a list of all fields used in
+    it. Default character sets deal with Alteryx formulas
+    
+    Works through the formula once, matching each string (starting with one
+    of the quote_chars) or field name (starting with one of the field_chars)
+    all the way to its end. Field names are added to the list in the order
+    they first appear, and anything inside strings is skipped.
+    
+    Results are memoised in formula_cache, so repeated formulas are only
+    analysed once.
+    """
+    key = formula_cache.key(formula, mode)
+    cached = formula_cache.get(key)
+    if not cached is None:
+        return list(cached)
+    
+    try:
+        tokenizer = _tokenizers[mode]
+    except KeyError:
+        raise ValueError("Invalid formula character set entered. "
+                         "Enter one of Alteryx/SQL")
+    
+    #dict used as an ordered set
+    fields = {}
+    for match in tokenizer.finditer(formula):
+        #each field alternative has its own group, and strings have none
+        if match.lastindex is None: continue
+        field = match.group(match.lastindex)
+        if field:
+            fields[field] = None
+    
+    formula_cache.put(key, tuple(fields))
+    return list(fields)
 
 if __name__ == "__main__":
     print(fields_from_formula("[date of birth] > CAST('2021-04-05' AS "
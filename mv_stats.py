@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 13:05:12 2026
+
+@author: marcu
+"""
+
+from contextlib import contextmanager
+import sys
+import time
+
+class Stats:
+    """
+    Wall time, net allocated memory blocks and number of calls for each
+    named phase of some work, plus a set of counters.
+
+    Phases are recorded either with the phase context manager, or by calling
+    start and then lap at the end of each consecutive phase. Stats from
+    several workflows can be combined with merge.
+    """
+    def __init__(self):
+        #phase name to a dict of calls, time in seconds and blocks
+        self.phases = {}
+        self.counters = {}
+        self._mark = None
+
+    def _record(self, phase, seconds, blocks):
+        p = self.phases.get(phase, None)
+        if p is None:
+            p = self.phases[phase] = {"calls": 0, "time": 0.0, "blocks": 0}
+        p["calls"] += 1
+        p["time"] += seconds
+        p["blocks"] += blocks
+
+    def start(self):
+        """
+        Start timing the first of a sequence of phases ended by lap
+        """
+        self._mark = (time.perf_counter(), sys.getallocatedblocks())
+
+    def lap(self, phase):
+        """
+        Record everything since the last call to start or lap as the given
+        phase, and start timing the next one
+        """
+        now = (time.perf_counter(), sys.getallocatedblocks())
+        if not self._mark is None:
+            self._record(phase, now[0] - self._mark[0],
+                         now[1] - self._mark[1])
+        self._mark = now
+
+    @contextmanager
+    def phase(self, phase):
+        """
+        Record the body of a with statement as the given phase
+        """
+        start = time.perf_counter()
+        blocks = sys.getallocatedblocks()
+        try:
+            yield self
+        finally:
+            self._record(phase, time.perf_counter() - start,
+                         sys.getallocatedblocks() - blocks)
+
+    def count(self, counter, n = 1):
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    @property
+    def total_time(self):
+        return sum(p["time"] for p in self.phases.values())
+
+    def merge(self, other):
+        """
+        Add the phases and counters of another Stats object to this one
+        """
+        for phase, p in other.phases.items():
+            mine = self.phases.setdefault(phase, {"calls": 0, "time": 0.0,
+                                                  "blocks": 0})
+            for k in mine:
+                mine[k] += p[k]
+        for counter, n in other.counters.items():
+            self.count(counter, n)
+        return self
+
+    def to_dict(self):
+        return {"phases": {k: dict(v) for k, v in self.phases.items()},
+                "counters": dict(self.counters),
+                "total_time": self.total_time}
+
+    def dump(self, filepath):
+        """
+        Write the stats to a JSON file
+        """
+        import json
+        with open(filepath, "w") as f:
+            json.dump(self.to_dict(), f, indent = 2, sort_keys = True)
+
+    def __getstate__(self):
+        return {"phases": self.phases, "counters": self.counters}
+
+    def __setstate__(self, state):
+        self.phases = state["phases"]
+        self.counters = state["counters"]
+        self._mark = None
+
+    def __repr__(self):
+        lines = ["%-24s %6s %10s %10s" % ("phase", "calls", "ms", "blocks")]
+        for phase, p in self.phases.items():
+            lines.append("%-24s %6d %10.3f %10d" % (phase, p["calls"],
+                                                    p["time"]*1000,
+                                                    p["blocks"]))
+        for counter, n in self.counters.items():
+            lines.append("%-24s %6d" % (counter, n))
+        return "\n".join(lines)
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 13:41:08 2026
+
+@author: marcu
+"""
+
+from xml.sax.saxutils import quoteattr, escape
+import argparse
+import random
+import sys
+
+#plugin, engine entry point, input connection names and output connection
+#names of each tool type the generator can produce
+tool_types = {
+    "input": ("AlteryxBasePluginsGui.DbFileInput.DbFileInput",
+              "AlteryxDbFileInput", (), ("Output",)),
+    "output": ("AlteryxBasePluginsGui.DbFileOutput.DbFileOutput",
+               "AlteryxDbFileOutput", ("Input",), ()),
+    "formula": ("AlteryxBasePluginsGui.Formula.Formula",
+                "AlteryxFormula", ("Input",), ("Output",)),
+    "multirow": ("AlteryxBasePluginsGui.MultiRowFormula.MultiRowFormula",
+                 "AlteryxMultiRowFormula", ("Input",), ("Output",)),
+    "filter": ("AlteryxBasePluginsGui.Filter.Filter",
+               "AlteryxFilter", ("Input",), ("True", "False")),
+    "select": ("AlteryxBasePluginsGui.AlteryxSelect.AlteryxSelect",
+               "AlteryxSelect", ("Input",), ("Output",)),
+    "join": ("AlteryxBasePluginsGui.Join.Join",
+             "AlteryxJoin", ("Left", "Right"), ("Left", "Join", "Right")),
+    "union": ("AlteryxBasePluginsGui.Union.Union",
+              "AlteryxUnion", ("Input",), ("Output",)),
+    "sort": ("AlteryxBasePluginsGui.Sort.Sort",
+             "AlteryxSort", ("Input",), ("Output",)),
+    "browse": ("AlteryxBasePluginsGui.BrowseV2.BrowseV2",
+               "AlteryxBrowseV2", ("Input",), ()),
+    "comment": ("AlteryxGuiToolkit.TextBox.TextBox", None, (), ()),
+    }
+
+container_plugin = "AlteryxGuiToolkit.ToolContainer.ToolContainer"
+
+default_tool_mix = {"formula": 30, "filter": 12, "select": 15, "join": 6,
+                    "union": 4, "multirow": 4, "sort": 10, "browse": 5,
+                    "output": 4, "input": 3, "comment": 2}
+
+class SyntheticWorkflow:
+    """
+    Generator of synthetic Alteryx workflow XML for benchmarking.
+
+    nodes is the number of tools, excluding containers. Each tool reads from
+    one of the previous window tools, except unions, which read from up to
+    fan_in tools, and joins, which read from two. No tool output is read by
+    more than fan_out tools if it can be avoided. Tools are split between
+    the top level and containers. container_depth must be 1, as nested
+    containers are not yet supported when drawing a workflow.
+    Formulas reference formula_size fields, each one of the given number of
+    distinct fields, and tool_mix gives the relative frequency of each tool
+    type.
+
+    The same arguments and seed always generate the same workflow.
+    """
+    def __init__(self, nodes = 1000, fan_in = 3, fan_out = 3,
+                 containers = 10, container_depth = 1, formula_size = 4,
+                 fields = 50, tool_mix = None, window = 20, seed = 0):
+        self.nodes = nodes
+        self.fan_in = max(fan_in, 2)
+        self.fan_out = max(fan_out, 1)
+        self.containers = containers
+        if container_depth > 1:
+            raise ValueError("Nested containers are not supported. "
+                             "container_depth must be 1")
+        self.container_depth = max(container_depth, 1)
+        self.formula_size = max(formula_size, 1)
+        self.fields = ["Field %d" % i for i in range(max(fields, 1))]
+        self.tool_mix = default_tool_mix if tool_mix is None else tool_mix
+        self.window = max(window, 1)
+        self.seed = seed
+
+    def _field(self, r):
+        return r.choice(self.fields)
+
+    def _expression(self, r):
+        terms = ["[%s]" % self._field(r) for i in range(self.formula_size)]
+        return " + ".join(terms)
+
+    def _config(self, kind, r):
+        """
+        Return the Configuration element of a tool of the given type
+        """
+        if kind == "formula":
+            fields = "".join(
+                '<FormulaField expression=%s field=%s size="8" '
+                'type="Double" />' % (quoteattr(self._expression(r)),
+                                     quoteattr(self._field(r)))
+                for i in range(r.randint(1, 3)))
+            return "<FormulaFields>%s</FormulaFields>" % fields
+        elif kind == "multirow":
+            return ('<UpdateField value="False" />'
+                    '<UpdateField_Name>%s</UpdateField_Name>'
+                    '<CreateField_Name>%s</CreateField_Name>'
+                    '<CreateField_Type>Int32</CreateField_Type>'
+                    '<CreateField_Size>4</CreateField_Size>'
+                    '<OtherRows>NULL</OtherRows><GroupByFields />'
+                    '<Expression value=%s />' % (
+                        escape(self._field(r)), escape(self._field(r)),
+                        quoteattr("[Row-1:%s] + 1" % self._field(r))))
+        elif kind == "filter":
+            if r.random() < 0.5:
+                return ("<Mode>Simple</Mode><Simple><Field>%s</Field>"
+                        "</Simple>" % escape(self._field(r)))
+            return ("<Mode>Custom</Mode><Expression>%s</Expression>" %
+                    escape(self._expression(r) + " > 0"))
+        elif kind == "select":
+            fields = "".join(
+                '<SelectField field=%s selected="True" rename=%s />' % (
+                    quoteattr(f), quoteattr(f + " 2"))
+                for f in r.sample(self.fields, min(3, len(self.fields))))
+            return ('<SelectFields>%s<SelectField field="*Unknown" '
+                    'selected="False" /></SelectFields>' % fields)
+        elif kind == "comment":
+            return "<Text>Synthetic workflow</Text>"
+        return ""
+
+    def _annotation(self):
+        return ('<Annotation DisplayMode="0"><Name /><DefaultAnnotationText />'
+                '<Left value="False" /></Annotation>')
+
+    def _node(self, tool_id, kind, x, y, r):
+        plugin, entry_point, inputs, outputs = tool_types[kind]
+        engine = ("" if entry_point is None else
+                  '<EngineSettings EngineDll="AlteryxBasePluginsEngine.dll" '
+                  'EngineDllEntryPoint="%s" />' % entry_point)
+        return ('<Node ToolID="%d"><GuiSettings Plugin="%s">'
+                '<Position x="%d" y="%d" /></GuiSettings><Properties>'
+                '<Configuration>%s</Configuration>%s</Properties>%s</Node>' %
+                (tool_id, plugin, x, y, self._config(kind, r),
+                 self._annotation(), engine))
+
+    def _container_open(self, tool_id, x, y, width, height, caption):
+        return ('<Node ToolID="%d"><GuiSettings Plugin="%s">'
+                '<Position x="%d" y="%d" width="%d" height="%d" />'
+                '</GuiSettings><Properties><Configuration>'
+                '<Caption>%s</Caption><Style TextColor="#314c4a" '
+                'FillColor="#ecf2f2" BorderColor="#314c4a" '
+                'Transparency="25" Margin="25" /><Disabled value="False" />'
+                '<Folded value="False" /></Configuration>%s</Properties>'
+                '<ChildNodes>' % (tool_id, container_plugin, x, y, width,
+                                  height, escape(caption),
+                                  self._annotation()))
+
+    def _kinds(self, r):
+        """
+        Return the list of tool types, in order. The first tool is always
+        an input.
+        """
+        kinds = list(self.tool_mix)
+        weights = [self.tool_mix[k] for k in kinds]
+        chosen = r.choices(kinds, weights = weights, k = self.nodes)
+        if chosen:
+            chosen[0] = "input"
+        return chosen
+
+    def _connections(self, kinds, r):
+        """
+        Return a list of (origin, origin connection, destination,
+        destination connection) tuples, indexed from 0
+        """
+        connections = []
+        #tools with outputs, and the number of times each has been read
+        sources = []
+        reads = {}
+        for i, kind in enumerate(kinds):
+            inputs = tool_types[kind][2]
+            if inputs and sources:
+                recent = sources[-self.window:]
+                if kind == "union":
+                    count = r.randint(2, self.fan_in)
+                    names = ["Input"]*count
+                else:
+                    names = list(inputs)
+                available = [s for s in recent if reads[s] < self.fan_out]
+                for name in names:
+                    s = r.choice(available or recent)
+                    reads[s] += 1
+                    if reads[s] >= self.fan_out and s in available:
+                        available.remove(s)
+                    connections.append((s, r.choice(tool_types[kinds[s]][3]),
+                                        i, name))
+            if tool_types[kind][3]:
+                sources.append(i)
+                reads[i] = 0
+        return connections
+
+    def _layout(self):
+        """
+        Split the tools into the top level and containers. Returns a list of
+        (depth, start, end) ranges of tool indices, one per container,
+        listed parent first, with the top level tools before the first
+        container.
+        """
+        n = self.nodes
+        count = self.containers*self.container_depth
+        if count == 0 or n == 0:
+            return n, []
+        per = max(n//(count + 1), 1)
+        top = n - per*count if per*count < n else 0
+        ranges = []
+        start = top
+        for c in range(count):
+            depth = c % self.container_depth
+            end = n if c == count - 1 else min(start + per, n)
+            ranges.append((depth, start, end))
+            start = end
+        return top, ranges
+
+    def generate(self):
+        """
+        Return the workflow XML as a string
+        """
+        r = random.Random(self.seed)
+        kinds = self._kinds(r)
+        connections = self._connections(kinds, r)
+        ids = list(range(1, self.nodes + 1))
+        next_id = self.nodes + 1
+        cols = 40
+
+        def position(i):
+            return 54 + 90*(i % cols), 54 + 90*(i//cols)
+
+        out = ['<?xml version="1.0"?>',
+               '<AlteryxDocument yxmdVer="2020.4">', '<Nodes>']
+        top, ranges = self._layout()
+        for i in range(top):
+            x, y = position(i)
+            out.append(self._node(ids[i], kinds[i], x, y, r))
+
+        open_depth = -1
+        for depth, start, end in ranges:
+            while open_depth >= depth:
+                out.append("</ChildNodes></Node>")
+                open_depth -= 1
+            x, y = position(start)
+            x_end, y_end = position(max(end - 1, start))
+            out.append(self._container_open(
+                next_id, 30, y - 24 - 10*depth,
+                90*cols + 60, y_end - y + 120 + 20*depth,
+                "Container %d" % next_id))
+            next_id += 1
+            open_depth = depth
+            for i in range(start, end):
+                x, y = position(i)
+                out.append(self._node(ids[i], kinds[i], x, y, r))
+        while open_depth >= 0:
+            out.append("</ChildNodes></Node>")
+            open_depth -= 1
+
+        out.append("</Nodes>")
+        out.append("<Connections>")
+        for o, o_name, d, d_name in connections:
+            out.append('<Connection><Origin ToolID="%d" Connection="%s" />'
+                       '<Destination ToolID="%d" Connection="%s" />'
+                       '</Connection>' % (ids[o], o_name, ids[d], d_name))
+        out.append("</Connections>")
+        out.append("<Properties /></AlteryxDocument>")
+        return "\n".join(out)
+
+    def write(self, filepath):
+        """
+        Write the workflow XML to a file, and return the file path
+        """
+        with open(filepath, "w", encoding = "utf-8") as f:
+            f.write(self.generate())
+        return filepath
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(
+        description = "Generate a synthetic Alteryx workflow")
+    parser.add_argument("nodes", type = int, help = "number of tools")
+    parser.add_argument("filepath", help = "output .yxmd file")
+    parser.add_argument("--fan-in", type = int, default = 3)
+    parser.add_argument("--fan-out", type = int, default = 3)
+    parser.add_argument("--containers", type = int, default = 10)
+    parser.add_argument("--container-depth", type = int, default = 1,
+                        help = "only 1 is supported")
+    parser.add_argument("--formula-size", type = int, default = 4)
+    parser.add_argument("--fields", type = int, default = 50)
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args(argv)
+
+    SyntheticWorkflow(nodes = args.nodes, fan_in = args.fan_in,
+                      fan_out = args.fan_out, containers = args.containers,
+                      container_depth = args.container_depth,
+                      formula_size = args.formula_size,
+                      fields = args.fields, seed = args.seed
+                      ).write(args.filepath)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,64 +6,98 @@ Created on Thu Jul 29 23:40:04 2021
 """
 
 from mh_logging import log
+from spatial import SpatialIndex
+import xml.etree.ElementTree as et
 import ntpath
         
 class Annotation:
-    def __init__(self, xml, trace = None):
-        log.log_trace(self, "__init__", trace)
-        self.xml = xml.find("Annotation")
-        self.annotation_xml = self.xml
-        self.display_mode = self.xml.attrib["DisplayMode"]
+    __slots__ = ("xml", "annotation_xml", "display_mode", "name", 
+                 "default_text", "flip_orientation")
+    @log.traced
+    def __init__(self, xml, trace = None, slim = False):
+        annotation_xml = xml.find("Annotation")
+        self.display_mode = annotation_xml.attrib["DisplayMode"]
         
         try:
-            self.name = self.xml.find("Name").attrib["value"]
+            self.name = annotation_xml.find("Name").attrib["value"]
         except KeyError:
             self.name = None
             
         try:
-            self.default_text = self.xml.find("DefaultAnnotationText").text
+            self.default_text = annotation_xml.find("DefaultAnnotationText").text
         except KeyError:
             self.default_text = ""
         
-        self.flip_orientation = self.xml.find("Left").attrib["value"]
+        self.flip_orientation = annotation_xml.find("Left").attrib["value"]
+        
+        #slim annotations keep only the values extracted above
+        self.xml = None if slim else annotation_xml
+        self.annotation_xml = self.xml
         
 class Node:
-    is_macro = False
-    is_decorator = False
-    is_input = False
-    is_output = False
-    is_multi_connection = False
-    is_browse = False
-    is_container = False
-    fields = []
-    is_defined_input = False
-    is_defined_output = False
-    container = None
-    formula = None
-    def __init__(self, xml, trace = None):
-        log.log_trace(self, "__init__", trace)
-        inf_trace = {"source": "function call", 
-                     "parent": self.__class__.__name__ + ".__init__"}
+    """
+    A single tool in a workflow. 
+    
+    If slim is True, no references to the ElementTree are kept. The scalar 
+    fields are extracted up front and the Configuration element is stored 
+    as serialized bytes, re-parsed each time the config property is read.
+    """
+    __slots__ = ("id", "type", "x", "y", "position", "annotation", 
+                 "macro_path", "engine_dll", "entry_point", "is_macro", 
+                 "is_decorator", "is_input", "is_output", 
+                 "is_multi_connection", "is_browse", "is_container", 
+                 "fields", "is_defined_input", "is_defined_output", 
+                 "container", "formula", "slim", "xml", "gui_settings", 
+                 "engine_settings", "properties", "_config", "_config_bytes")
+    @log.traced
+    def __init__(self, xml, trace = None, slim = False):
+        self.is_macro = False
+        self.is_decorator = False
+        self.is_input = False
+        self.is_output = False
+        self.is_multi_connection = False
+        self.is_browse = False
+        self.is_container = False
+        self.fields = []
+        self.is_defined_input = False
+        self.is_defined_output = False
+        self.container = None
+        self.formula = None
         
         n = xml
-        self.xml = xml
+        self.slim = slim
         self.id = n.attrib["ToolID"]
-        self.gui_settings = n.find("GuiSettings")
-        self.engine_settings = n.find("EngineSettings")
-        self.properties = n.find("Properties")
-        self.config = (None if self.properties is None 
-                       else self.properties.find("Configuration"))
+        gui_settings = n.find("GuiSettings")
+        engine_settings = n.find("EngineSettings")
+        properties = n.find("Properties")
+        config = (None if properties is None 
+                  else properties.find("Configuration"))
+        
+        if slim:
+            self.xml = None
+            self.gui_settings = None
+            self.engine_settings = None
+            self.properties = None
+            self._config = None
+            self._config_bytes = (None if config is None 
+                                  else et.tostring(config))
+        else:
+            self.xml = xml
+            self.gui_settings = gui_settings
+            self.engine_settings = engine_settings
+            self.properties = properties
+            self._config = config
+            self._config_bytes = None
         
-        if self.engine_settings is None:
+        if engine_settings is None:
             #no interaction with Alteryx engine = no impact on workflow
             #results
             self.is_decorator = True
         
         if not self.is_decorator:
-            self.annotation = Annotation(self.properties, 
-                                         trace = inf_trace)
+            self.annotation = Annotation(properties, slim = slim)
             try:
-                self.macro_path = self.engine_settings.attrib["Macro"]
+                self.macro_path = engine_settings.attrib["Macro"]
                 self.is_macro = True
                 self.type = ntpath.basename(self.macro_path)
                 # self.type = "__AlteryxMacro__"
@@ -71,13 +105,14 @@ class Node:
                 pass
         
         if not self.is_macro:
-            self.type = self.gui_settings.attrib["Plugin"]
+            self.type = gui_settings.attrib["Plugin"]
         
         if not self.is_macro and not self.is_decorator:
-            self.engine_dll = self.engine_settings.attrib["EngineDll"]
-            self.entry_point = self.engine_settings.attrib["EngineDllEntryPoint"]
+            self.engine_dll = engine_settings.attrib["EngineDll"]
+            self.entry_point = engine_settings.attrib["EngineDllEntryPoint"]
 
-        self.position = self.gui_settings.find("Position").attrib
+        position = gui_settings.find("Position").attrib
+        self.position = dict(position) if slim else position
         self.x = int(self.position['x'])
         self.y = int(self.position['y'])
         
@@ -87,99 +122,201 @@ class Node:
             
         elif self.type == "AlteryxGuiToolkit.ToolContainer.ToolContainer":
             self.is_container = True
+    
+    @property
+    def config(self):
+        """
+        The Configuration element of the node. For slim nodes this is parsed 
+        from the stored bytes on each access.
+        """
+        if self._config_bytes is None:
+            return self._config
+        return et.fromstring(self._config_bytes)
 
 class Nodes:
-    def __init__(self, xml, node_tag = "Nodes", trace = None):
-        log.log_trace(self, "__init__", trace)
-        inf_trace = {"source": "function call", 
-                     "parent": self.__class__.__name__ + ".__init__"}
-        
-        self.xml = xml
-        self.nodes_dict = self.map_nodes(xml, node_tag, trace = inf_trace)
-        self.nodes = list(self.nodes_dict.values())
-        self.count = len(self.nodes)
+    #width and height of a tool on the canvas
+    node_size = 50
+    #SpatialIndex of the box of each node, built on first use
+    _spatial_index = None
+    @log.traced
+    def __init__(self, xml, node_tag = "Nodes", trace = None, slim = False):
+        self.xml = None if slim else xml
+        #insertion-ordered dict of ToolID to Node object. An empty Nodes 
+        #object can be created by passing xml = None, and populated one node 
+        #at a time with add_node
+        self.nodes_dict = ({} if xml is None else
+                           self.map_nodes(xml, node_tag, slim = slim))
+        #container ToolID to the ToolIDs of the nodes within it, used as an
+        #ordered set
+        self.container_nodes = {}
+        for n in self.nodes_dict.values():
+            if not n.container is None:
+                self.container_nodes.setdefault(n.container.id, {})[n.id] = None
+        self.count = len(self.nodes_dict)
+    
+    @property
+    def nodes(self):
+        """
+        List of Node objects in workflow order
+        """
+        return list(self.nodes_dict.values())
     
     def __iter__(self):
         """
         Allow iteration of node object like "for n in Nodes". Equivalent to
-        doing "for n in Nodes.nodes.values()"
+        doing "for n in Nodes.nodes"
         """
-        self._i = -1
-        return self
-    
-    def __next__(self):
-        if self._i < self.count - 1:
-            self._i += 1
-            return self.nodes[self._i]
-        else:
-            raise StopIteration
+        return iter(self.nodes)
     
-    def map_nodes(self, xml, nodes_tag, trace = None):
-        log.log_trace(self, "map_nodes", trace)
-        inf_trace = {"source": "function call", 
-                     "parent": self.__class__.__name__ + ".map_nodes"}
+    @log.traced
+    def map_nodes(self, xml, nodes_tag, trace = None, slim = False):
         """
         For a given ElementTree xml object, returns a dictionary of ToolIDs 
         and Node objects
         """
         search_tag = "Node" if (nodes_tag == "" 
                                 or nodes_tag is None) else nodes_tag + "/Node"
-        nd = {n.attrib['ToolID']: Node(n, trace = inf_trace)
+        nd = {n.attrib['ToolID']: Node(n, slim = slim)
               for n in xml.findall(search_tag)}
         return nd
     
+    @log.traced
+    def copy(self, trace = None):
+        """
+        Return a new Nodes object sharing the same Node objects, which nodes
+        can be added to or removed from independently of this one
+        """
+        new = Nodes(None)
+        new.nodes_dict = dict(self.nodes_dict)
+        new.container_nodes = {k: dict(v) 
+                               for k, v in self.container_nodes.items()}
+        new.count = self.count
+        return new
+    
+    def node_box(self, n):
+        """
+        Return the (x1, y1, x2, y2) covered by a node on the canvas. 
+        Containers have their own width and height.
+        """
+        width = getattr(n, "width", self.node_size)
+        height = getattr(n, "height", self.node_size)
+        return (n.x, n.y, n.x + width, n.y + height)
+    
+    @property
+    def spatial_index(self):
+        """
+        SpatialIndex of the box of every node, by ToolID. It is built on
+        first use and kept up to date as nodes are added and removed.
+        """
+        if self._spatial_index is None:
+            index = SpatialIndex(cell_size = 4*self.node_size)
+            for n in self.nodes_dict.values():
+                index.insert(n.id, self.node_box(n))
+            self._spatial_index = index
+        return self._spatial_index
+    
+    @log.traced
+    def get_nodes_in(self, box, trace = None):
+        """
+        Return the list of Node objects overlapping the given (x1, y1, x2, 
+        y2) box, in the order they were added
+        """
+        return [self.nodes_dict[nid] 
+                for nid in self.spatial_index.query(box)]
+    
+    @log.traced
+    def get_node_at(self, x, y, trace = None):
+        """
+        Return the Node object at the given position, preferring nodes 
+        over the containers they are in, or None if there is no node there
+        """
+        node_ids = self.spatial_index.query_point(x, y)
+        for nid in reversed(node_ids):
+            if not self.nodes_dict[nid].is_container:
+                return self.nodes_dict[nid]
+        return self.nodes_dict[node_ids[-1]] if node_ids else None
+    
+    @log.traced
     def get_node(self, node_id, trace = None):
-        log.log_trace(self, "get_node", trace)
         """
         Return the Node object corresponding to node_id
         """
         return self.nodes_dict[node_id]
     
-    def add_nodes(self, xml, parent_node = None, trace = None):
-        log.log_trace(self, "add_nodes", trace)
-        inf_trace = {"source": "function call", 
-                     "parent": self.__class__.__name__ + ".add_nodes"}
-        
-        new_nodes = Nodes(xml, node_tag = "", trace = inf_trace)
+    @log.traced
+    def get_container_nodes(self, container_id, trace = None):
+        """
+        Return the list of Node objects within the given container
+        """
+        return [self.nodes_dict[nid] 
+                for nid in self.container_nodes.get(container_id, ())]
+    
+    @log.traced
+    def add_node(self, node, parent_node = None, trace = None):
+        """
+        Add a single Node object
+        """
+        if not parent_node is None:
+            node.container = parent_node
+        self.nodes_dict[node.id] = node
+        if not node.container is None:
+            self.container_nodes.setdefault(node.container.id, {})[node.id] = None
+        if not self._spatial_index is None:
+            self._spatial_index.insert(node.id, self.node_box(node))
+        self.count = len(self.nodes_dict)
+    
+    @log.traced
+    def add_nodes(self, xml, parent_node = None, trace = None, slim = False):
+        new_nodes = Nodes(xml, node_tag = "", slim = slim)
         
         for n in new_nodes:
-            n.container = parent_node
-        
-        self.nodes_dict = {**self.nodes_dict, **new_nodes.nodes_dict}
-        self.nodes = self.nodes + new_nodes.nodes
-        self.count = len(self.nodes)
+            self.add_node(n, parent_node = parent_node)
         
+    @log.traced
     def remove_node(self, node_id, trace = None):
-        log.log_trace(self, "remove_node", trace)
         """
         Remove all nodes with the given id(s)
         """
         if type(node_id) == str:
             node_id = [node_id]
-        for n in self.nodes:
-            if n.id in node_id: self.nodes.remove(n)
-        self.count = len(self.nodes)
+        for nid in node_id:
+            n = self.nodes_dict.pop(nid, None)
+            if n is None: 
+                continue
+            if not n.container is None:
+                self.container_nodes.get(n.container.id, {}).pop(nid, None)
+            if not self._spatial_index is None:
+                self._spatial_index.remove(nid)
+        self.count = len(self.nodes_dict)
     
+    @log.traced
     def remove_container(self, c, remove_container = False, 
-                         minimise_container = True, trace = None):
-        log.log_trace(self, "remove_container", trace)
-        inf_trace = {"source": "function call", 
-                     "parent": self.__class__.__name__ + ".remove_container"}
+                         minimise_container = True, trace = None,
+                         containers = None):
         """
         Remove all nodes in the given container. Optionally remove the
         container itself as well, or shrink its size.
+        
+        Shrinking requires the Containers object the container belongs to,
+        which replaces it with a resized copy. The same copy is used here, so
+        other objects sharing the Container object are unaffected.
         """
         if remove_container:
-            for n in self.nodes:
-                if n.container == c: 
-                    self.remove_node(n.id, trace = inf_trace)
-            self.remove_node(c.id, trace = inf_trace)
+            self.remove_node(list(self.container_nodes.get(c.id, ())))
+            self.container_nodes.pop(c.id, None)
+            self.remove_node(c.id)
         elif minimise_container:
-            c.height = 20
-            c.width = 150
+            if containers is None:
+                raise ValueError("The Containers object of container %s "
+                                 "must be given to minimise it" % c.id)
+            c_new = containers.minimise(c.id)
+            if c.id in self.nodes_dict:
+                self.nodes_dict[c.id] = c_new
+                if not self._spatial_index is None:
+                    self._spatial_index.insert(c.id, self.node_box(c_new))
         
+    @log.traced
     def get_nodes_attr(self, attrib, value, trace = None):
-        log.log_trace(self, "get_nodes_attr", trace)
         """
         Get list of nodes where attribute matches the given value
         """
@@ -203,6 +340,14 @@ class Nodes:
             out = [getattr(n, attr, None) for n in self.nodes]
         return out
     
+    def extents(self):
+        """
+        Return the (x1, y1, x2, y2) enclosing every node, including their
+        size, or None if there are no nodes. Unlike max_position, which gives
+        the largest node coordinate, x2 and y2 are the far edges of the nodes.
+        """
+        return self.spatial_index.bounds
+    
     def max_position(self, xy):
         coords = self.attr(xy)
         return max(coords)
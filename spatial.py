@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 16:12:40 2026
+
+@author: marcu
+"""
+
+def intersects(box1, box2):
+    """
+    Return whether two (x1, y1, x2, y2) boxes overlap or touch
+    """
+    return (box1[0] <= box2[2] and box1[2] >= box2[0] and
+            box1[1] <= box2[3] and box1[3] >= box2[1])
+
+def bounding_box(vertices, margin = 0):
+    """
+    Return the (x1, y1, x2, y2) box enclosing a list of (x, y) vertices,
+    grown by margin on every side
+    """
+    xs = [xy[0] for xy in vertices]
+    ys = [xy[1] for xy in vertices]
+    return (min(xs) - margin, min(ys) - margin,
+            max(xs) + margin, max(ys) + margin)
+
+class SpatialIndex:
+    """
+    Uniform grid index of axis-aligned boxes (x1, y1, x2, y2), each stored
+    against a key, e.g. a ToolID.
+
+    Each box is registered in every grid cell it overlaps, so a query only
+    looks at the boxes in the cells it covers. With a cell size around the
+    size of the boxes, queries take time proportional to the area queried
+    and the number of results, rather than the number of boxes. Results
+    are returned in the order the keys were inserted, which for a diagram
+    is the order objects are drawn in.
+    """
+    def __init__(self, cell_size = 256):
+        self.cell_size = cell_size
+        #key to box, in insertion order
+        self.boxes = {}
+        #(column, row) to the keys of the boxes overlapping it, used as an
+        #ordered set
+        self.cells = {}
+        #key to the order it was inserted in
+        self.order = {}
+        self._next = 0
+        #(x1, y1, x2, y2) enclosing every box, or None if it needs to be
+        #recalculated
+        self._bounds = None
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def __contains__(self, key):
+        return key in self.boxes
+
+    def _cell_range(self, box):
+        x1, y1, x2, y2 = box
+        size = self.cell_size
+        return (range(int(x1//size), int(x2//size) + 1),
+                range(int(y1//size), int(y2//size) + 1))
+
+    def insert(self, key, box):
+        """
+        Add a box for the given key. If the key already has a box, it is
+        replaced, and the key keeps its place in the insertion order.
+        """
+        order = self.order.get(key, None)
+        if order is None:
+            order = self._next
+            self._next += 1
+        else:
+            self.remove(key)
+        x1, y1, x2, y2 = box
+        box = (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+        self.boxes[key] = box
+        self.order[key] = order
+
+        cols, rows = self._cell_range(box)
+        cells = self.cells
+        for col in cols:
+            for row in rows:
+                cell = cells.get((col, row), None)
+                if cell is None:
+                    cell = cells[(col, row)] = {}
+                cell[key] = None
+
+        if len(self.boxes) == 1:
+            self._bounds = box
+        elif not self._bounds is None:
+            b = self._bounds
+            self._bounds = (min(b[0], box[0]), min(b[1], box[1]),
+                            max(b[2], box[2]), max(b[3], box[3]))
+
+    def remove(self, key):
+        """
+        Remove the box of the given key, if it has one
+        """
+        box = self.boxes.pop(key, None)
+        if box is None:
+            return
+        del self.order[key]
+        cols, rows = self._cell_range(box)
+        cells = self.cells
+        for col in cols:
+            for row in rows:
+                cell = cells.get((col, row), None)
+                if cell is None: continue
+                cell.pop(key, None)
+                if not cell:
+                    del cells[(col, row)]
+        #the bounds only change if the box was on their edge
+        b = self._bounds
+        if (not b is None and
+            (box[0] <= b[0] or box[1] <= b[1] or
+             box[2] >= b[2] or box[3] >= b[3])):
+            self._bounds = None
+
+    def _sorted(self, keys):
+        order = self.order
+        return sorted(keys, key = lambda k: order[k])
+
+    def query(self, box):
+        """
+        Return the keys of every box intersecting the given box, including
+        those that only touch its edge, in insertion order
+        """
+        x1, y1, x2, y2 = box
+        boxes = self.boxes
+        cells = self.cells
+        cols, rows = self._cell_range(box)
+        found = {}
+        for col in cols:
+            for row in rows:
+                cell = cells.get((col, row), None)
+                if cell is None: continue
+                for key in cell:
+                    if key in found: continue
+                    b = boxes[key]
+                    if b[0] <= x2 and b[2] >= x1 and b[1] <= y2 and b[3] >= y1:
+                        found[key] = None
+        return self._sorted(found)
+
+    def query_point(self, x, y):
+        """
+        Return the keys of every box containing the given point, in
+        insertion order
+        """
+        size = self.cell_size
+        cell = self.cells.get((int(x//size), int(y//size)), ())
+        boxes = self.boxes
+        return self._sorted(
+            key for key in cell
+            if boxes[key][0] <= x <= boxes[key][2] and
+               boxes[key][1] <= y <= boxes[key][3])
+
+    def at(self, x, y):
+        """
+        Return the key of the last inserted box containing the given point,
+        i.e. the topmost object drawn there, or None if there is none
+        """
+        keys = self.query_point(x, y)
+        return keys[-1] if keys else None
+
+    @property
+    def bounds(self):
+        """
+        (x1, y1, x2, y2) enclosing every box, or None if the index is empty
+        """
+        if self._bounds is None and self.boxes:
+            boxes = self.boxes.values()
+            self._bounds = (min(b[0] for b in boxes), min(b[1] for b in boxes),
+                            max(b[2] for b in boxes), max(b[3] for b in boxes))
+        return self._bounds
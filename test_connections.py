@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:42:18 2026
+
+@author: marcu
+"""
+
+import random
+import xml.etree.ElementTree as et
+import pytest
+from connections import Connection, Connections
+
+node_ids = [str(i) for i in range(1, 11)]
+types = ["Output", "True", "False", "Left", "Right"]
+
+def connection(origin, destination, origin_type = "Output",
+               destination_type = "Input"):
+    return Connection(et.fromstring(
+        '<Connection><Origin ToolID="%s" Connection="%s" />'
+        '<Destination ToolID="%s" Connection="%s" /></Connection>' % (
+            origin, origin_type, destination, destination_type)))
+
+def ids(components):
+    return [(c.id, c.type) for c in components]
+
+def check(connections):
+    """
+    Check every lookup of a Connections object against a linear scan of
+    its connections in workflow order, as the lookups were originally done
+    """
+    scan = connections.connections
+    assert connections.count == len(scan)
+    for nid in node_ids:
+        outputs = [c for c in scan if c.origin.id == nid]
+        inputs = [c for c in scan if c.destination.id == nid]
+        assert connections.get_output_connections(nid) == outputs
+        assert connections.get_input_connections(nid) == inputs
+        assert connections.get_connections(nid) == [
+            c for c in scan if nid in (c.origin.id, c.destination.id)]
+        assert ids(connections.next_node(nid)) == ids(
+            c.destination for c in outputs)
+        assert ids(connections.previous_node(nid)) == ids(
+            c.origin for c in inputs)
+        assert connections.is_node_multiconnection(nid) == (
+            len(inputs) > 1 or len({c.origin.type for c in outputs}) > 1)
+
+def random_connection(r):
+    return connection(r.choice(node_ids), r.choice(node_ids),
+                      r.choice(types))
+
+def mutate(connections, r):
+    """
+    Apply one random add, remove, rewire or node removal
+    """
+    op = r.randrange(5)
+    existing = connections.connections
+    if op == 0 or not existing:
+        connections.add(random_connection(r))
+    elif op == 1:
+        connections.remove(r.choice(existing))
+    elif op == 2:
+        connections.set_origin(r.choice(existing), r.choice(node_ids),
+                               r.choice(types + [None]))
+    elif op == 3:
+        connections.set_destination(r.choice(existing), r.choice(node_ids))
+    else:
+        connections.remove_node_connections(r.choice(node_ids))
+
+@pytest.mark.parametrize("seed", range(5))
+def test_lookups_match_linear_scan(seed):
+    r = random.Random(seed)
+    connections = Connections(None)
+    for i in range(30):
+        connections.add(random_connection(r))
+    check(connections)
+    for i in range(200):
+        mutate(connections, r)
+        check(connections)
+
+def test_map_connections():
+    xml = et.fromstring(
+        '<AlteryxDocument><Connections>'
+        '<Connection><Origin ToolID="1" Connection="Output" />'
+        '<Destination ToolID="2" Connection="Input" /></Connection>'
+        '<Connection><Origin ToolID="1" Connection="True" />'
+        '<Destination ToolID="3" Connection="Input" /></Connection>'
+        '<Connection><Origin ToolID="2" Connection="Output" />'
+        '<Destination ToolID="3" Connection="Input" /></Connection>'
+        '</Connections></AlteryxDocument>')
+    connections = Connections(xml)
+    check(connections)
+    assert ids(connections.next_node("1")) == [("2", "Input"),
+                                                ("3", "Input")]
+    assert connections.is_node_multiconnection("1")
+    assert connections.is_node_multiconnection("3")
+    assert not connections.is_node_multiconnection("2")
+
+@pytest.mark.parametrize("seed", range(3))
+def test_copy_is_independent(seed):
+    r = random.Random(seed)
+    base = Connections(None)
+    for i in range(30):
+        base.add(random_connection(r))
+    before = [(c.origin.id, c.origin.type, c.destination.id,
+               c.destination.type) for c in base]
+    copy = base.copy()
+    for i in range(100):
+        mutate(copy, r)
+        check(copy)
+    check(base)
+    assert [(c.origin.id, c.origin.type, c.destination.id,
+             c.destination.type) for c in base] == before
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 21:14:52 2026
+
+@author: marcu
+"""
+
+import pytest
+from fields import FieldIndex, field_name
+
+class Node:
+    def __init__(self, node_id):
+        self.id = node_id
+
+@pytest.mark.parametrize("name, field", [
+    ("Amount", "Amount"),
+    ("Row-1:Amount", "Amount"),
+    ("Row+2:Order ID", "Order ID"),
+    ("Rowan", "Rowan"),
+    ("*Unknown", None),
+    ("__FieldName__", None),
+    ("_CurrentField_", None),
+    ("Engine.WorkflowDirectory", None),
+    ("User.Threshold", None),
+    ])
+def test_field_name(name, field):
+    assert field_name(name) == field
+
+def test_add_ignores_pseudo_fields():
+    index = FieldIndex()
+    a, b = Node("1"), Node("2")
+    index.add(["Amount", "Row-1:Amount", "*Unknown", "__FieldName__"], a)
+    index.add("Engine.TempFilePath", b)
+    index.add("Region", b)
+    assert list(index) == ["Amount", "Region"]
+    assert index.count == 2
+    assert index.get_nodes("Amount") == [a]
+    assert index.node_fields == {"1": {"Amount"}, "2": {"Region"}}
+    index.remove_node("1")
+    assert list(index) == ["Region"]
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:10:37 2026
+
+@author: marcu
+"""
+
+import pytest
+from mountain_view_alteryx import Workflow
+from mv_synthetic import SyntheticWorkflow
+
+@pytest.fixture
+def workflow(tmp_path):
+    filepath = SyntheticWorkflow(nodes = 200, containers = 4,
+                                 seed = 1).write(tmp_path / "synthetic.yxmd")
+    return Workflow(filepath)
+
+def snapshot(w):
+    """
+    Return the registries of a workflow as plain values, including the
+    identity and geometry of the shared Node and Container objects
+    """
+    nodes = w.nodes
+    connections = w.connections
+    return {
+        "nodes": [(nid, id(n), n.x, n.y, getattr(n, "width", None),
+                   getattr(n, "height", None), n.is_input, n.is_output)
+                  for nid, n in nodes.nodes_dict.items()],
+        "container_nodes": {cid: list(d)
+                            for cid, d in nodes.container_nodes.items()},
+        "connections": [(i, id(c), c.origin.id, c.origin.type,
+                         c.destination.id, c.destination.type)
+                        for i, c in connections.connections_dict.items()],
+        "outputs": {nid: list(d)
+                    for nid, d in connections.outputs_dict.items()},
+        "inputs": {nid: list(d)
+                   for nid, d in connections.inputs_dict.items()},
+        "containers": [(cid, id(c), c.x, c.y, c.width, c.height)
+                       for cid, c in w.containers.containers_dict.items()],
+        "fields": {f: list(d) for f, d in w.field_index.fields_dict.items()},
+        }
+
+def test_meta_workflow_leaves_base_unchanged(workflow):
+    workflow.node_flags
+    before = snapshot(workflow)
+    fields = sorted(workflow.field_index)[:10]
+    meta_workflows = [workflow.build_meta_workflow(f) for f in fields]
+    assert snapshot(workflow) == before
+
+    #the views did remove nodes, rewire connections and minimise containers
+    assert any(m.nodes.count < workflow.nodes.count for m in meta_workflows)
+    assert any(m.connections.connections_dict !=
+               workflow.connections.connections_dict for m in meta_workflows)
+    assert any("minimised" in m.collapsed.values() for m in meta_workflows)
+
+def test_minimised_container_is_consistent(workflow):
+    meta_workflow = workflow.build_meta_workflow("Field 10")
+    minimised = [cid for cid, how in meta_workflow.collapsed.items()
+                 if how == "minimised"]
+    assert minimised
+    for cid in minimised:
+        c = meta_workflow.containers.get_container(cid)
+        assert (c.width, c.height) == (150, 20)
+        assert workflow.containers.get_container(cid) is not c
+        #the nodes of the view, if they still include the container, use
+        #the same resized copy
+        if cid in meta_workflow.nodes.nodes_dict:
+            assert meta_workflow.nodes.nodes_dict[cid] is c
+            assert (meta_workflow.nodes.spatial_index.boxes[cid] ==
+                    meta_workflow.nodes.node_box(c))
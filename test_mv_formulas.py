@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 18:05:12 2026
+
+@author: marcu
+"""
+
+import pytest
+import mv_formulas as mvf
+
+#(formula, mode, fields in order of first appearance). The fields match
+#those found by the original fields_from_formula, except for unterminated
+#strings, which it could not handle
+cases = [
+    ("[date of birth] > CAST('2021-04-05' AS datetime) AND "
+     "\"anvil\" = 'falling'", "Alteryx", ["date of birth"]),
+    ('IF [Status] = "Closed" THEN [Closed Date] ELSE DateTimeNow() ENDIF',
+     "Alteryx", ["Status", "Closed Date"]),
+    ("IIF(IsNull([Amount]), 0, [Amount]) * [Rate]", "Alteryx",
+     ["Amount", "Rate"]),
+    ("Contains([Name], '[not a field]') AND [Region] != \"[also not]\"",
+     "Alteryx", ["Name", "Region"]),
+    ("Trim([Customer ID], \" \") + 'it''s'", "Alteryx", ["Customer ID"]),
+    #Python-like subscripts are not strings inside a field name
+    ("len(row['name']) > 3 and [score] >= 10", "Alteryx",
+     ["'name'", "score"]),
+    ("[Total] + [Unterminated", "Alteryx", ["Total"]),
+    ("[Total] + 'unterminated [string]", "Alteryx", ["Total"]),
+    ("", "Alteryx", []),
+    ("SELECT \"Order ID\", [Ship Date] FROM orders "
+     "WHERE name = 'O''Brien [x]'", "SQL", ["Order ID", "Ship Date"]),
+    ("\"Amount\" * 1.2 AS \"Gross\"", "SQL", ["Amount", "Gross"]),
+    ]
+
+@pytest.mark.parametrize("formula, mode, fields", cases)
+def test_fields_from_formula(formula, mode, fields):
+    mvf.formula_cache.clear()
+    assert mvf.fields_from_formula(formula, mode) == fields
+    #a second call is answered from the cache
+    assert mvf.fields_from_formula(formula, mode) == fields
+    assert mvf.formula_cache.hits == 1
+
+def test_invalid_mode():
+    with pytest.raises(ValueError):
+        mvf.fields_from_formula("[a]", "Python")
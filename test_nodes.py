@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 20:05:44 2026
+
+@author: marcu
+"""
+
+import random
+import pytest
+from mountain_view_alteryx import Workflow
+from mv_synthetic import SyntheticWorkflow
+from spatial import intersects
+
+@pytest.fixture
+def workflow(tmp_path):
+    filepath = SyntheticWorkflow(nodes = 200, containers = 4,
+                                 seed = 2).write(tmp_path / "synthetic.yxmd")
+    return Workflow(filepath)
+
+def check(nodes, order):
+    """
+    Check a Nodes object holds the given ToolIDs in order, and that its
+    index of container members matches a scan of the nodes
+    """
+    assert [n.id for n in nodes] == order
+    assert list(nodes.nodes_dict) == order
+    assert nodes.count == len(order)
+    scan = {}
+    for n in nodes:
+        if not n.container is None:
+            scan.setdefault(n.container.id, []).append(n.id)
+    assert {cid: list(d) for cid, d in nodes.container_nodes.items()
+            if d} == scan
+    for cid, node_ids in scan.items():
+        assert [n.id for n in nodes.get_container_nodes(cid)] == node_ids
+
+def test_workflow_order(workflow):
+    #top level nodes in the order of the file, then the nodes of each
+    #container, which are added after it
+    nodes = workflow.nodes
+    order = [n.id for n in nodes]
+    containers = [c.id for c in workflow.containers]
+    assert containers
+    first = min(order.index(cid) for cid in containers)
+    assert all(not nodes.get_node(nid).container is None
+               for nid in order[first:] if not nid in containers)
+    assert all(nodes.get_node(nid).container is None for nid in order[:first])
+    check(nodes, order)
+
+@pytest.mark.parametrize("seed", range(3))
+def test_add_and_remove(workflow, seed):
+    r = random.Random(seed)
+    nodes = workflow.nodes
+    order = [n.id for n in nodes]
+    removed = []
+    for i in range(300):
+        if removed and r.random() < 0.4:
+            n = removed.pop(r.randrange(len(removed)))
+            nodes.add_node(n)
+            order.append(n.id)
+        elif order:
+            batch = r.sample(order, min(len(order), r.randint(1, 3)))
+            removed += [nodes.get_node(nid) for nid in batch]
+            nodes.remove_node(batch if len(batch) > 1 else batch[0])
+            order = [nid for nid in order if not nid in batch]
+        check(nodes, order)
+    #removing a node that is not there does nothing
+    nodes.remove_node("not a node")
+    check(nodes, order)
+
+def test_add_to_container(workflow):
+    nodes = workflow.nodes
+    c = workflow.containers.containers[0]
+    n = next(n for n in nodes if n.container is None and not n.is_container)
+    nodes.remove_node(n.id)
+    nodes.add_node(n, parent_node = c)
+    assert n.container is c
+    assert nodes.get_container_nodes(c.id)[-1] is n
+    check(nodes, [nid for nid in nodes.nodes_dict])
+
+def test_remove_container(workflow):
+    nodes = workflow.nodes
+    c = workflow.containers.containers[0]
+    members = [n.id for n in nodes.get_container_nodes(c.id)]
+    assert members
+    order = [n.id for n in nodes
+             if not n.id in members and n.id != c.id]
+    nodes.remove_container(c, remove_container = True,
+                           minimise_container = False)
+    assert not c.id in nodes.container_nodes
+    check(nodes, order)
+
+def test_copy_is_independent(workflow):
+    nodes = workflow.nodes
+    order = [n.id for n in nodes]
+    container_nodes = {cid: list(d)
+                       for cid, d in nodes.container_nodes.items()}
+    copy = nodes.copy()
+    c = workflow.containers.containers[0]
+    removed = [n.id for n in copy.get_container_nodes(c.id)][:3]
+    copy.remove_node(removed)
+    check(copy, [nid for nid in order if not nid in removed])
+    check(nodes, order)
+    assert ({cid: list(d) for cid, d in nodes.container_nodes.items()} ==
+            container_nodes)
+
+def check_index(nodes):
+    """
+    Check the spatial index of a Nodes object against the box of each of
+    its nodes
+    """
+    index = nodes.spatial_index
+    assert dict(index.boxes) == {n.id: nodes.node_box(n) for n in nodes}
+    for n in nodes:
+        x1, y1, x2, y2 = nodes.node_box(n)
+        assert n in nodes.get_nodes_in((x1, y1, x1, y1))
+        assert n.id in index.query_point(x2, y2)
+
+@pytest.mark.parametrize("seed", range(3))
+def test_spatial_index(workflow, seed):
+    r = random.Random(seed)
+    nodes = workflow.nodes
+    check_index(nodes)
+    removed = []
+    for i in range(100):
+        if removed and r.random() < 0.4:
+            nodes.add_node(removed.pop())
+        else:
+            n = r.choice(nodes.nodes)
+            nodes.remove_node(n.id)
+            removed.append(n)
+        check_index(nodes)
+
+def test_spatial_index_minimise(workflow):
+    nodes = workflow.nodes
+    containers = workflow.containers
+    c = containers.containers[0]
+    member = nodes.get_container_nodes(c.id)[-1]
+    check_index(nodes)
+    order = nodes.spatial_index.query(nodes.spatial_index.bounds)
+    nodes.remove_container(c, containers = containers)
+    c_new = containers.get_container(c.id)
+    assert nodes.get_node(c.id) is c_new
+    check_index(nodes)
+    #the container keeps its place in the drawing order
+    assert nodes.spatial_index.query(nodes.spatial_index.bounds) == order
+    x1, y1, x2, y2 = nodes.node_box(member)
+    if not intersects((x1, y1, x2, y2), nodes.node_box(c_new)):
+        assert nodes.get_node_at(x1 + 1, y1 + 1) is member
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 20:31:09 2026
+
+@author: marcu
+"""
+
+import random
+import pytest
+from spatial import SpatialIndex, intersects
+
+def brute_query(boxes, box):
+    return [k for k, b in boxes.items() if intersects(b, box)]
+
+def brute_point(boxes, x, y):
+    return [k for k, b in boxes.items()
+            if b[0] <= x <= b[2] and b[1] <= y <= b[3]]
+
+def check(index, boxes):
+    """
+    Check an index against a brute force search of a dict of key to box in
+    insertion order, including that no empty cells are left behind
+    """
+    assert len(index) == len(boxes)
+    assert dict(index.boxes) == boxes
+    assert all(index.cells.values())
+    for key, cell in index.cells.items():
+        for k in cell:
+            cols, rows = index._cell_range(boxes[k])
+            assert key[0] in cols and key[1] in rows
+    if boxes:
+        assert index.bounds == (min(b[0] for b in boxes.values()),
+                                min(b[1] for b in boxes.values()),
+                                max(b[2] for b in boxes.values()),
+                                max(b[3] for b in boxes.values()))
+    else:
+        assert index.bounds is None
+
+def test_insert_replaces_box_and_keeps_order():
+    index = SpatialIndex(cell_size = 10)
+    index.insert("a", (0, 0, 100, 100))
+    index.insert("b", (20, 20, 30, 30))
+    index.insert("a", (50, 50, 60, 60))
+    check(index, {"a": (50, 50, 60, 60), "b": (20, 20, 30, 30)})
+    assert index.query((0, 0, 10, 10)) == []
+    #a keeps its place before b
+    assert index.query((0, 0, 100, 100)) == ["a", "b"]
+    index.insert("b", (55, 55, 56, 56))
+    assert index.query_point(55, 55) == ["a", "b"]
+    assert index.at(55, 55) == "b"
+
+def test_insert_normalises_box():
+    index = SpatialIndex(cell_size = 10)
+    index.insert("a", (30, 40, 10, 20))
+    assert index.boxes["a"] == (10, 20, 30, 40)
+    assert index.query_point(15, 25) == ["a"]
+
+def test_remove():
+    index = SpatialIndex(cell_size = 10)
+    index.insert("a", (0, 0, 100, 100))
+    index.insert("b", (20, 20, 30, 30))
+    index.remove("a")
+    check(index, {"b": (20, 20, 30, 30)})
+    assert index.query_point(50, 50) == []
+    assert not "a" in index
+    #removing a missing key does nothing
+    index.remove("a")
+    index.remove("b")
+    check(index, {})
+    assert index.cells == {}
+    assert index.at(25, 25) is None
+
+@pytest.mark.parametrize("x, y", [(10, 10), (20, 20), (10, 20), (20, 10),
+                                  (15, 10), (10, 15), (20, 15), (15, 20)])
+def test_query_point_on_cell_boundaries(x, y):
+    #the box exactly covers the cell (1, 1), so its edges and corners lie
+    #on the boundaries with the neighbouring cells
+    index = SpatialIndex(cell_size = 10)
+    index.insert("a", (10, 10, 20, 20))
+    assert index.query_point(x, y) == ["a"]
+    assert index.query((x, y, x, y)) == ["a"]
+
+@pytest.mark.parametrize("x, y", [(9.9, 15), (20.1, 15), (15, 9.9),
+                                  (15, 20.1)])
+def test_query_point_outside_boundaries(x, y):
+    index = SpatialIndex(cell_size = 10)
+    index.insert("a", (10, 10, 20, 20))
+    assert index.query_point(x, y) == []
+
+def test_negative_coordinates():
+    index = SpatialIndex(cell_size = 10)
+    index.insert("a", (-20, -20, -10, -10))
+    index.insert("b", (-10, -10, 0, 0))
+    assert index.query_point(-10, -10) == ["a", "b"]
+    assert index.query_point(-20, -20) == ["a"]
+    assert index.query_point(0, 0) == ["b"]
+    assert index.query_point(-0.5, -0.5) == ["b"]
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_brute_force(seed):
+    r = random.Random(seed)
+    index = SpatialIndex(cell_size = 16)
+    boxes = {}
+    def random_box():
+        x, y = r.randint(-50, 150), r.randint(-50, 150)
+        return (x, y, x + r.randint(0, 40), y + r.randint(0, 40))
+    for i in range(400):
+        op = r.random()
+        key = r.randrange(40)
+        if op < 0.6:
+            box = random_box()
+            index.insert(key, box)
+            #a replaced key keeps its position in the insertion order
+            boxes[key] = box
+        else:
+            index.remove(key)
+            boxes.pop(key, None)
+        check(index, boxes)
+        box = random_box()
+        assert index.query(box) == brute_query(boxes, box)
+        #points on cell boundaries as well as anywhere
+        x = r.choice([r.randint(-50, 190), 16*r.randint(-4, 12)])
+        y = r.choice([r.randint(-50, 190), 16*r.randint(-4, 12)])
+        assert index.query_point(x, y) == brute_point(boxes, x, y)